@@ -0,0 +1,245 @@
+import os
+import re
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from asgiref.sync import SyncToAsync
+from asgiref.wsgi import WsgiToAsgiInstance
+
+from flask_server import app as flask_app
+from context_store import context_store, session_key_from_token
+from opened_context_cache import opened_context_cache
+from metrics import observe_upstream
+from upstream import HOP_BY_HOP_HEADERS, EXCLUDED_REQUEST_HEADERS
+
+from utils import (
+    BASE_API_URL,
+    CORS_ORIGINS,
+    UPSTREAM_CONNECT_TIMEOUT,
+    UPSTREAM_READ_TIMEOUT,
+    UPSTREAM_RETRIES,
+    ASGI_UPSTREAM_MAX_CONNECTIONS,
+    ASGI_WORKER_THREADS,
+)
+
+# Executor terbatas untuk route Flask (face analysis, CKKS, dll.)
+wsgi_executor = ThreadPoolExecutor(
+    max_workers=ASGI_WORKER_THREADS,
+    thread_name_prefix='asgi-wsgi',
+)
+
+class BoundedWsgiToAsgiInstance(WsgiToAsgiInstance):
+    # Default asgiref menjalankan semua request WSGI di satu thread
+    run_wsgi_app = SyncToAsync(
+        WsgiToAsgiInstance.__dict__['run_wsgi_app'].func,
+        thread_sensitive=False,
+        executor=wsgi_executor,
+    )
+
+# Date & Server ditulis sendiri oleh server ASGI
+EXCLUDED_RESPONSE_HEADERS = HOP_BY_HOP_HEADERS | {'date', 'server'}
+
+class ProxyRoute:
+    def __init__(self, method: str, path: str, upstream_path: str,
+                 require_authorization: bool = False, after=None):
+        self.method = method
+        self.pattern = re.compile(f'^{path}$')
+        self.upstream_path = upstream_path
+        self.require_authorization = require_authorization
+        self.after = after
+
+def evict_context(headers: dict):
+    key = session_key_from_token(headers.get('authorization'))
+    context_store.evict(key)
+    opened_context_cache.forget_session(key)
+
+# Route pass-through yang dilayani langsung di event loop (URL sama dengan blueprint Flask)
+PROXY_ROUTES = [
+    ProxyRoute('POST', '/api/auth/register', '/auth/register'),
+    ProxyRoute('POST', '/api/auth/login', '/auth/login'),
+    ProxyRoute('POST', '/api/auth/logout', '/auth/logout', after=evict_context),
+    ProxyRoute('GET', '/api/user-profile/check-saved-context-key', '/user/profile/check-saved-context-key',
+               require_authorization=True),
+    ProxyRoute('GET', '/api/face-registration/get-registered-faces', '/user/face-registration/get-registered-faces'),
+]
+
+REGISTERED_FACE_CONTENT_PATTERN = re.compile(r'^/api/face-registration/get-registered-face-content/(?P<id>[^/]+)$')
+
+class AsyncServiceApp:
+    """ASGI entry point.
+
+    Pass-through routes are proxied with non-blocking upstream I/O on the
+    event loop; every other request is handed to the Flask app on a bounded
+    thread pool.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.client = None
+
+    def _create_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=BASE_API_URL,
+            timeout=httpx.Timeout(UPSTREAM_READ_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=ASGI_UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=ASGI_UPSTREAM_MAX_CONNECTIONS,
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=UPSTREAM_RETRIES),
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+
+        if scope['type'] == 'http':
+            for route in PROXY_ROUTES:
+                if scope['method'] == route.method and route.pattern.match(scope['path']):
+                    return await self._proxy(route, scope, receive, send)
+
+            match = REGISTERED_FACE_CONTENT_PATTERN.match(scope['path'])
+            if scope['method'] == 'GET' and match:
+                return await self._registered_face_content(match['id'], scope, send)
+
+        await BoundedWsgiToAsgiInstance(self.wsgi_app)(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.client = self._create_client()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.client is not None:
+                    await self.client.aclose()
+                wsgi_executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Server tanpa lifespan
+        if self.client is None:
+            self.client = self._create_client()
+        return self.client
+
+    @staticmethod
+    def _request_headers(scope) -> list:
+        return [(name.decode('latin1'), value.decode('latin1')) for (name, value) in scope['headers']]
+
+    @staticmethod
+    def _cors_headers(headers: dict) -> list:
+        origin = headers.get('origin')
+        if origin in CORS_ORIGINS:
+            return [(b'access-control-allow-origin', origin.encode('latin1')), (b'vary', b'Origin')]
+        return []
+
+    async def _send_json(self, send, status: int, body: dict, headers: dict):
+        content = json.dumps(body).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(content)).encode()),
+            ] + self._cors_headers(headers),
+        })
+        await send({'type': 'http.response.body', 'body': content})
+
+    async def _stream_response(self, send, response: httpx.Response, response_headers: list, headers: dict):
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': response_headers + self._cors_headers(headers),
+            })
+            async for chunk in response.aiter_raw():
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            await response.aclose()
+
+    async def _proxy(self, route: ProxyRoute, scope, receive, send):
+        request_headers = self._request_headers(scope)
+        headers = {name.lower(): value for (name, value) in request_headers}
+
+        if route.require_authorization and 'authorization' not in headers:
+            return await self._send_json(send, 401, {'error': True, 'message': 'Authorization header is missing'}, headers)
+
+        forwarded_headers = [(name, value) for (name, value) in request_headers
+                            if name.lower() not in EXCLUDED_REQUEST_HEADERS]
+        content = None
+        chunked = 'transfer-encoding' in headers
+        if chunked or headers.get('content-length', '0') != '0':
+            if not chunked:
+                # Body diteruskan dengan panjang aslinya, tanpa di-buffer
+                forwarded_headers.append(('Content-Length', headers['content-length']))
+            # Tanpa Content-Length httpx mengirimnya chunked ke backend
+
+            async def request_body():
+                while True:
+                    message = await receive()
+                    yield message.get('body', b'')
+                    if not message.get('more_body'):
+                        break
+            content = request_body()
+
+        client = self._get_client()
+        started = time.perf_counter()
+        try:
+            request = client.build_request(
+                route.method,
+                route.upstream_path,
+                params=scope['query_string'].decode('latin1') or None,
+                headers=forwarded_headers,
+                content=content,
+            )
+            response = await client.send(request, stream=True)
+        except Exception as e:
+            observe_upstream(route.method, route.upstream_path, 'error', time.perf_counter() - started)
+            return await self._send_json(send, 500, {'error': True, 'message': str(e)}, headers)
+        observe_upstream(route.method, route.upstream_path, response.status_code, time.perf_counter() - started)
+
+        response_headers = [(name, value) for (name, value) in response.headers.raw
+                            if name.decode('latin1').lower() not in EXCLUDED_RESPONSE_HEADERS]
+        await self._stream_response(send, response, response_headers, headers)
+
+        if route.after is not None:
+            route.after(headers)
+
+    async def _registered_face_content(self, registered_face_id: str, scope, send):
+        headers = {name.lower(): value for (name, value) in self._request_headers(scope)}
+        forwarded_headers = {}
+        if 'authorization' in headers:
+            forwarded_headers['Authorization'] = headers['authorization']
+
+        client = self._get_client()
+        upstream_path = f'/user/face-registration/registered-face/{registered_face_id}'
+        started = time.perf_counter()
+        try:
+            request = client.build_request('GET', upstream_path, headers=forwarded_headers)
+            response = await client.send(request, stream=True)
+        except Exception as e:
+            observe_upstream('GET', upstream_path, 'error', time.perf_counter() - started)
+            return await self._send_json(send, 500, {'error': True, 'message': str(e)}, headers)
+        observe_upstream('GET', upstream_path, response.status_code, time.perf_counter() - started)
+
+        if response.status_code != 200:
+            await response.aclose()
+            return await self._send_json(send, 404, {'error': True, 'message': 'Picture not found'}, headers)
+
+        content_type = response.headers.get('content-type', 'application/octet-stream')
+        response_headers = [(b'content-type', content_type.encode('latin1'))]
+        encoding = response.headers.get('content-encoding')
+        if encoding:
+            # aiter_raw tidak men-decode body
+            response_headers.append((b'content-encoding', encoding.encode('latin1')))
+        await self._stream_response(send, response, response_headers, headers)
+
+app = AsyncServiceApp(flask_app)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.environ.get('PORT', 5001))
+    uvicorn.run(app, host='0.0.0.0', port=port)
@@ -0,0 +1,78 @@
+"""Size, latency and precision of every CKKS parameter profile.
+
+For each profile in utils.CKKS_PROFILES: key generation time, serialized
+context sizes, ciphertext size, encrypt / dot / decrypt latency and the
+error of the encrypted dot product against the plaintext one.
+
+Usage (dari folder service/):
+    python -m benchmarks.ckks_profiles [--profiles v1 v2 ...] [--pairs N] [--output FILE]
+"""
+import time
+import argparse
+import numpy as np
+import tenseal as ts
+
+from benchmarks.common import measure, write_results
+
+from utils import CKKS_PROFILES, EMBEDDING_SIZE, create_ckks_context, normalize_vector
+
+def random_embedding(rng) -> list:
+    return normalize_vector(rng.standard_normal(EMBEDDING_SIZE).tolist())
+
+def run(profile: str, pairs: int, repeat: int, rng) -> dict:
+    started = time.perf_counter()
+    context = create_ckks_context(profile)
+    keygen_ms = (time.perf_counter() - started) * 1000
+
+    public_context = context.copy()
+    public_context.make_context_public()
+    serialized_public_context = public_context.serialize()
+    server_context = ts.context_from(serialized_public_context)
+
+    a = random_embedding(rng)
+    b = random_embedding(rng)
+    encrypted_a = ts.ckks_vector(context, a)
+    serialized_b = ts.ckks_vector(context, b).serialize()
+    encrypted_b = ts.ckks_vector_from(server_context, serialized_b)
+    encrypted_result = ts.ckks_vector_from(server_context, encrypted_a.serialize()).dot(encrypted_b)
+    serialized_result = encrypted_result.serialize()
+
+    errors = []
+    for i in range(pairs):
+        x = random_embedding(rng)
+        # Pasangan pertama identik (skor ~1.0)
+        y = x if i == 0 else random_embedding(rng)
+        result = ts.ckks_vector_from(context, ts.ckks_vector(context, x).dot(ts.ckks_vector(context, y)).serialize())
+        errors.append(abs(result.decrypt()[0] - float(np.dot(x, y))))
+
+    return {
+        'params': {key: value for (key, value) in CKKS_PROFILES[profile].items() if key != 'global_scale'},
+        'global_scale_bits': int(np.log2(CKKS_PROFILES[profile]['global_scale'])),
+        'keygen_ms': round(keygen_ms, 3),
+        'context_bytes': len(context.serialize(save_public_key=True, save_secret_key=True, save_galois_keys=True, save_relin_keys=True)),
+        'public_context_bytes': len(serialized_public_context),
+        'ciphertext_bytes': len(serialized_b),
+        'result_bytes': len(serialized_result),
+        'encrypt': measure(lambda: ts.ckks_vector(context, a).serialize(), repeat),
+        'context_from': measure(lambda: ts.context_from(serialized_public_context), max(1, repeat // 10)),
+        'dot': measure(lambda: encrypted_a.dot(encrypted_b), repeat),
+        'decrypt': measure(lambda: ts.ckks_vector_from(context, serialized_result).decrypt(), repeat),
+        'max_abs_error': float(max(errors)),
+        'mean_abs_error': float(np.mean(errors)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profiles', nargs='*', default=list(CKKS_PROFILES))
+    parser.add_argument('--pairs', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    results = {profile: run(profile, args.pairs, args.repeat, rng) for profile in args.profiles}
+    write_results(results, args.output)
+
+if __name__ == '__main__':
+    main()
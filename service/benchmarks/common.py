@@ -0,0 +1,87 @@
+import os
+import sys
+import glob
+import json
+import math
+import time
+import platform
+import statistics
+import subprocess
+from importlib import metadata
+
+SERVICE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_IMAGES_PATH = os.path.join(SERVICE_PATH, '..', 'ui', 'src', 'assets')
+
+# Supaya modul service (utils, face_analysis, ...) bisa di-import langsung
+if SERVICE_PATH not in sys.path:
+    sys.path.insert(0, SERVICE_PATH)
+
+def load_images(paths: list | None = None) -> list:
+    """Return (filename, bytes) for the given JPEGs, or the bundled UI assets."""
+    if not paths:
+        paths = sorted(
+            glob.glob(os.path.join(SAMPLE_IMAGES_PATH, '*.jpg')) +
+            glob.glob(os.path.join(SAMPLE_IMAGES_PATH, '*.jpeg'))
+        )
+    images = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            images.append((os.path.basename(path), f.read()))
+    return images
+
+def percentile(samples: list, q: float) -> float:
+    """Nearest-rank percentile of already sorted samples."""
+    return samples[max(0, math.ceil(len(samples) * q) - 1)]
+
+def measure(fn, repeat: int, warmup: int = 1) -> dict:
+    """Run `fn` `repeat` times and return latency stats in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'repeat': repeat,
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(samples[len(samples) // 2], 3),
+        'p95_ms': round(percentile(samples, 0.95), 3),
+        'min_ms': round(samples[0], 3),
+        'max_ms': round(samples[-1], 3),
+    }
+
+def environment() -> dict:
+    """Commit, interpreter and library versions, to compare results across runs."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=SERVICE_PATH, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    packages = {}
+    for package in ('numpy', 'opencv-python', 'opencv-python-headless', 'tenseal', 'onnxruntime', 'insightface'):
+        try:
+            packages[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            pass
+
+    return {
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'packages': packages,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+def write_results(results: dict, output: str | None):
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text)
+    print(text)
@@ -0,0 +1,71 @@
+"""Throughput of per-request model.get vs the recognition micro-batcher.
+
+Usage (dari folder service/):
+    python -m benchmarks.inference_batching [images ...] [--concurrency N] [--requests N] [--output FILE]
+"""
+import os
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import load_images, percentile, write_results
+
+from utils import preprocess_image, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS
+from inference_scheduler import RecognitionBatcher
+import face_analysis
+
+def run(get_faces, imgs: list, concurrency: int, requests: int) -> dict:
+    latencies = []
+
+    def one_request(i):
+        started = time.perf_counter()
+        get_faces(imgs[i % len(imgs)])
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one_request, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'throughput_rps': round(requests / elapsed, 3),
+        'p50_ms': round(latencies[len(latencies) // 2], 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('images', nargs='*')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--max-batch-size', type=int, default=BATCH_MAX_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=BATCH_MAX_WAIT_MS)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    imgs = []
+    for filename, content in load_images(args.images):
+        (name, extension) = os.path.splitext(filename)
+        imgs.append(preprocess_image(np.frombuffer(content, np.uint8), name, extension, 'none')['rgb_img'])
+
+    face_analysis.get_model().get(imgs[0])
+    results = {
+        'concurrency': args.concurrency,
+        'requests': args.requests,
+        'per_request': run(face_analysis.model.get, imgs, args.concurrency, args.requests),
+    }
+
+    face_analysis.recognition_batcher = RecognitionBatcher(
+        face_analysis.model.models['recognition'],
+        max_batch_size=args.max_batch_size,
+        max_wait=args.max_wait_ms / 1000,
+    )
+    results['batched'] = run(face_analysis.get_faces_batched, imgs, args.concurrency, args.requests)
+    results['batched']['scheduler'] = face_analysis.recognition_batcher.stats()
+
+    write_results(results, args.output)
+
+if __name__ == '__main__':
+    main()
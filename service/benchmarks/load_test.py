@@ -0,0 +1,244 @@
+"""End-to-end load test of flask_server.app against the stub backend.
+
+Every simulated employee registers, generates a context key and registers
+faces (setup, not measured), then clock-in bursts are replayed: users
+arrive with exponential inter-arrival times inside a short window and each
+one logs in, opens the saved context key, lists its registered faces and
+verifies a captured image. Reports throughput and p50/p95/p99 per endpoint.
+
+The stub backend (stub_backend.py) is started in-process on --stub-port and
+BASE_API_URL is pointed at it, unless --backend-url is given.
+
+Usage (dari folder service/):
+    python -m benchmarks.load_test [images ...] [--users N] [--bursts N] [--burst-seconds S]
+        [--concurrency N] [--packed] [--service-url URL] [--output FILE]
+"""
+import os
+import time
+import random
+import argparse
+import threading
+import statistics
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import load_images, percentile, write_results, environment
+
+PASSWORD = 'load-test-password'
+
+class Recorder:
+    """Latency samples and error count per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append(seconds * 1000)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, wall_seconds: float) -> dict:
+        report = {}
+        with self._lock:
+            for endpoint, samples in sorted(self.samples.items()):
+                samples = sorted(samples)
+                report[endpoint] = {
+                    'requests': len(samples),
+                    'errors': self.errors.get(endpoint, 0),
+                    'throughput_rps': round(len(samples) / wall_seconds, 3),
+                    'mean_ms': round(statistics.fmean(samples), 3),
+                    'p50_ms': round(percentile(samples, 0.50), 3),
+                    'p95_ms': round(percentile(samples, 0.95), 3),
+                    'p99_ms': round(percentile(samples, 0.99), 3),
+                    'max_ms': round(samples[-1], 3),
+                }
+        return report
+
+class InProcessClient:
+    """flask_server.app through its test client (satu client per thread)."""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method: str, path: str, headers: dict, json=None, files=None, form=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        data = None
+        if files:
+            data = {name: [(BytesIO(content), filename) for (filename, content) in items]
+                    for (name, items) in files.items()}
+            data.update(form or {})
+        response = client.open(path, method=method, headers=headers, json=json, data=data)
+        return response.status_code, response.get_json(silent=True)
+
+class HttpClient:
+    """A running service (flask_server, asgi_server, prefork_server) over HTTP."""
+
+    def __init__(self, base_url: str):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def request(self, method: str, path: str, headers: dict, json=None, files=None, form=None):
+        files = [(name, (filename, content, 'image/jpeg'))
+                 for (name, items) in (files or {}).items()
+                 for (filename, content) in items] or None
+        response = self.session.request(method, f'{self.base_url}{path}', headers=headers, json=json, files=files, data=form)
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+
+class Employee:
+    def __init__(self, client, recorder: Recorder, index: int, packed: bool = False):
+        self.client = client
+        self.recorder = recorder
+        # Form field `packed` untuk register-faces
+        self.form = {'packed': '1' if packed else '0'}
+        self.email = f'employee{index}@load.test'
+        self.headers = {}
+        self.mnemonic_phrase = None
+
+    def call(self, endpoint: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        status, body = self.client.request(method, path, self.headers, **kwargs)
+        ok = status < 400 and isinstance(body, dict) and not body.get('error')
+        self.recorder.record(endpoint, time.perf_counter() - started, ok)
+        if not ok:
+            raise RuntimeError(f'{method} {path}: {status} {body}')
+        return body['data']
+
+    def login(self):
+        data = self.call('login', 'POST', '/api/auth/login', json={'email': self.email, 'password': PASSWORD})
+        self.headers = {'Authorization': f'Bearer {data["access_token"]}'}
+
+    def setup(self, images: list):
+        self.call('register', 'POST', '/api/auth/register', json={
+            'email': self.email,
+            'full_name': self.email.split('@')[0],
+            'password': PASSWORD,
+        })
+        self.login()
+        self.mnemonic_phrase = self.call('generate_context_key', 'POST', '/api/user-profile/generate-context-key')
+        self.call('open_saved_context_key', 'POST', '/api/user-profile/open-saved-context-key',
+                  json={'mnemonic_phrase': self.mnemonic_phrase})
+        self.call('register_faces', 'POST', '/api/face-registration/register-faces', files={'images': images}, form=self.form)
+        self.call('logout', 'POST', '/api/auth/logout')
+
+    def clock_in(self, captured_image: tuple):
+        self.login()
+        opened = self.call('check_opened_saved_context_key', 'GET', '/api/user-profile/check-opened-saved-context-key')
+        if not opened['exists']:
+            self.call('open_saved_context_key', 'POST', '/api/user-profile/open-saved-context-key',
+                      json={'mnemonic_phrase': self.mnemonic_phrase})
+        self.call('get_registered_faces', 'GET', '/api/face-registration/get-registered-faces')
+        self.call('verify', 'POST', '/api/face-verification', files={'captured_image': [captured_image]})
+        self.call('logout', 'POST', '/api/auth/logout')
+
+def start_stub_backend(port: int):
+    from werkzeug.serving import make_server
+    import stub_backend
+
+    server = make_server('127.0.0.1', port, stub_backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def replay_bursts(employees: list, images: list, bursts: int, burst_seconds: float, concurrency: int, rng) -> tuple:
+    """Replay clock-in bursts; returns the wall time and the failed clock-ins."""
+    failures = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(bursts):
+            futures = []
+            arrival = 0.0
+            burst_started = time.perf_counter()
+            # Kedatangan acak (Poisson) dalam jendela burst_seconds
+            for employee in rng.sample(employees, len(employees)):
+                delay = arrival - (time.perf_counter() - burst_started)
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(employee.clock_in, rng.choice(images)))
+                arrival += rng.expovariate(len(employees) / burst_seconds) if burst_seconds > 0 else 0
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    failures.append(str(e))
+    return time.perf_counter() - started, failures
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('images', nargs='*')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--bursts', type=int, default=3)
+    parser.add_argument('--burst-seconds', type=float, default=5.0, help='window in which every user clocks in')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--packed', action='store_true', help='register faces packed (several per ciphertext)')
+    parser.add_argument('--service-url', help='load a running service instead of flask_server.app in-process')
+    parser.add_argument('--backend-url', help='use this backend instead of starting stub_backend')
+    parser.add_argument('--stub-port', type=int, default=5050)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    if args.backend_url:
+        os.environ['BASE_API_URL'] = args.backend_url
+    else:
+        os.environ['BASE_API_URL'] = f'http://127.0.0.1:{args.stub_port}/api/v1'
+        stub_server = start_stub_backend(args.stub_port)
+
+    if args.service_url:
+        client = HttpClient(args.service_url)
+    else:
+        # Import setelah BASE_API_URL di-set
+        import flask_server
+        client = InProcessClient(flask_server.app)
+
+    images = load_images(args.images)
+    rng = random.Random(args.seed)
+
+    setup_recorder = Recorder()
+    employees = [Employee(client, setup_recorder, index, args.packed) for index in range(args.users)]
+    setup_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(lambda employee: employee.setup(images), employees))
+    setup_seconds = time.perf_counter() - setup_started
+
+    recorder = Recorder()
+    for employee in employees:
+        employee.recorder = recorder
+    wall_seconds, failures = replay_bursts(employees, images, args.bursts, args.burst_seconds, args.concurrency, rng)
+
+    results = {
+        'environment': environment(),
+        'config': {
+            'users': args.users,
+            'bursts': args.bursts,
+            'burst_seconds': args.burst_seconds,
+            'concurrency': args.concurrency,
+            'packed': args.packed,
+            'target': args.service_url or 'flask_server.app',
+            'backend': os.environ['BASE_API_URL'],
+            'images': [filename for (filename, _) in images],
+        },
+        'setup': setup_recorder.report(setup_seconds),
+        'clock_in': {
+            'wall_seconds': round(wall_seconds, 3),
+            'clock_ins_per_second': round((args.users * args.bursts - len(failures)) / wall_seconds, 3),
+            'failures': len(failures),
+            'failure_samples': failures[:5],
+            'endpoints': recorder.report(wall_seconds),
+        },
+    }
+    write_results(results, args.output)
+
+    if not args.backend_url:
+        stub_server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""Micro-benchmarks of every stage of the face and CKKS pipeline (CPU only).
+
+Stages: loading the face models (time and peak RSS), preprocess_image, model.get, get_primary_face, normalize_vector,
+ckks_vector encrypt, serialize, ckks_vector_from, context_from and the
+encrypted dot product + decrypt. Results are JSON with the commit and
+library versions; pass a previous result as --baseline to get the change
+per stage.
+
+Usage (dari folder service/):
+    python -m benchmarks.pipeline [images ...] [--repeat N] [--skip-model] [--output FILE] [--baseline FILE]
+"""
+import os
+import json
+import time
+import argparse
+import resource
+import numpy as np
+import cv2
+import tenseal as ts
+
+from benchmarks.common import load_images, measure, write_results, environment
+
+from utils import (
+    PREPROCESS_PROFILE,
+    CKKS_PROFILE,
+    EMBEDDING_SIZE,
+    preprocess_image,
+    normalize_vector,
+    create_ckks_context,
+)
+
+def synthetic_image(seed: int) -> tuple:
+    """640x480 JPEG (tanpa wajah) bila tidak ada gambar contoh."""
+    rng = np.random.default_rng(seed)
+    img = cv2.GaussianBlur(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8), (0, 0), 3)
+    _, encoded = cv2.imencode('.jpg', img)
+    return ('synthetic.jpg', encoded.tobytes())
+
+def peak_rss_mb() -> float:
+    # ru_maxrss dalam KiB di Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def model_load_stage() -> dict:
+    """Load time and peak RSS growth of face_analysis.get_model (FACE_MODULES)."""
+    import face_analysis
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    face_model = face_analysis.get_model()
+    return {
+        'modules': list(face_model.models),
+        'seconds': round(time.perf_counter() - started, 3),
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_rss_growth_mb': round(peak_rss_mb() - rss_before, 1),
+    }
+
+def image_stages(images: list, profile: str, repeat: int, skip_model: bool) -> tuple:
+    results = {}
+    embeddings = []
+    if not skip_model:
+        import face_analysis
+        face_model = face_analysis.get_model()
+
+    for filename, content in images:
+        (name, extension) = os.path.splitext(filename)
+        file_bytes = np.frombuffer(content, np.uint8)
+        rgb_img = preprocess_image(file_bytes, name, extension, profile)['rgb_img']
+        image_results = {
+            'bytes': len(content),
+            'preprocess_image': measure(lambda: preprocess_image(file_bytes, name, extension, profile), repeat),
+        }
+
+        if not skip_model:
+            image_results['model.get'] = measure(lambda: face_model.get(rgb_img), repeat)
+            image_results['get_primary_face'] = measure(lambda: face_analysis.get_primary_face(rgb_img), repeat)
+            faces = face_model.get(rgb_img)
+            image_results['faces'] = len(faces)
+            if faces:
+                embeddings.append(faces[0].embedding.tolist())
+
+        results[filename] = image_results
+    return results, embeddings
+
+def crypto_stages(embedding: list, ckks_profile: str, repeat: int) -> dict:
+    context = create_ckks_context(ckks_profile)
+    public_context = context.copy()
+    public_context.make_context_public()
+    serialized_context = context.serialize(save_public_key=True, save_secret_key=True, save_galois_keys=True, save_relin_keys=True)
+    serialized_public_context = public_context.serialize()
+    server_context = ts.context_from(serialized_public_context)
+
+    encrypted_vector = ts.ckks_vector(context, embedding)
+    serialized_vector = encrypted_vector.serialize()
+    query = ts.ckks_vector_from(server_context, serialized_vector)
+    registered = ts.ckks_vector_from(server_context, ts.ckks_vector(context, embedding).serialize())
+    serialized_result = query.dot(registered).serialize()
+
+    def dot_and_decrypt():
+        result = ts.ckks_vector_from(server_context, serialized_vector).dot(registered)
+        return ts.ckks_vector_from(context, result.serialize()).decrypt()
+
+    slow_repeat = max(1, repeat // 5)
+    return {
+        'ckks_profile': ckks_profile,
+        'context_bytes': len(serialized_context),
+        'public_context_bytes': len(serialized_public_context),
+        'ciphertext_bytes': len(serialized_vector),
+        'normalize_vector': measure(lambda: normalize_vector(embedding), repeat * 10),
+        'ckks_vector': measure(lambda: ts.ckks_vector(context, embedding), repeat),
+        'serialize': measure(lambda: encrypted_vector.serialize(), repeat),
+        'ckks_vector_from': measure(lambda: ts.ckks_vector_from(server_context, serialized_vector), repeat),
+        'context_from': measure(lambda: ts.context_from(serialized_context), slow_repeat),
+        'context_from_public': measure(lambda: ts.context_from(serialized_public_context), slow_repeat),
+        'dot': measure(lambda: query.dot(registered), repeat),
+        'decrypt': measure(lambda: ts.ckks_vector_from(context, serialized_result).decrypt(), repeat),
+        'dot_and_decrypt': measure(dot_and_decrypt, repeat),
+    }
+
+def compare(results, baseline):
+    """Tambahkan change_pct (mean_ms) dibanding hasil baseline."""
+    if isinstance(results, dict) and isinstance(baseline, dict):
+        if 'mean_ms' in results and baseline.get('mean_ms'):
+            results['change_pct'] = round((results['mean_ms'] - baseline['mean_ms']) / baseline['mean_ms'] * 100, 2)
+            results['baseline_mean_ms'] = baseline['mean_ms']
+        for key, value in results.items():
+            if key in baseline:
+                compare(value, baseline[key])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('images', nargs='*')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--preprocess-profile', default=PREPROCESS_PROFILE)
+    parser.add_argument('--ckks-profile', default=CKKS_PROFILE)
+    parser.add_argument('--skip-model', action='store_true', help='do not load buffalo_l (no model.get)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output')
+    parser.add_argument('--baseline', help='previous result file to compare against')
+    args = parser.parse_args()
+
+    images = load_images(args.images) or [synthetic_image(args.seed)]
+    model_load = None if args.skip_model else model_load_stage()
+    image_results, embeddings = image_stages(images, args.preprocess_profile, args.repeat, args.skip_model)
+
+    # Embedding asli bila ada, selain itu vektor acak (seed tetap)
+    embedding = embeddings[0] if embeddings else \
+        np.random.default_rng(args.seed).standard_normal(EMBEDDING_SIZE).tolist()
+    embedding = normalize_vector(embedding)
+
+    results = {
+        'environment': environment(),
+        'config': {
+            'repeat': args.repeat,
+            'preprocess_profile': args.preprocess_profile,
+            'skip_model': args.skip_model,
+        },
+        'model_load': model_load,
+        'images': image_results,
+        'crypto': crypto_stages(embedding, args.ckks_profile, args.repeat),
+    }
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+    write_results(results, args.output)
+
+if __name__ == '__main__':
+    main()
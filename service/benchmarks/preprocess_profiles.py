@@ -0,0 +1,50 @@
+"""Latency and embedding drift of each utils.preprocess_image profile.
+
+Usage (dari folder service/):
+    python -m benchmarks.preprocess_profiles [images ...] [--repeat N] [--output FILE]
+"""
+import os
+import argparse
+import numpy as np
+
+from benchmarks.common import load_images, measure, write_results
+
+from utils import PREPROCESS_PROFILES, preprocess_image, normalize_vector
+from face_analysis import get_model
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('images', nargs='*')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    model = get_model()
+    results = {'profiles': {}}
+    for filename, content in load_images(args.images):
+        (name, extension) = os.path.splitext(filename)
+        file_bytes = np.frombuffer(content, np.uint8)
+        reference = None
+
+        for profile in PREPROCESS_PROFILES:
+            timing = measure(lambda: preprocess_image(file_bytes, name, extension, profile), args.repeat)
+            faces = model.get(preprocess_image(file_bytes, name, extension, profile)['rgb_img'])
+            embedding = normalize_vector(faces[0].embedding.tolist()) if faces else None
+
+            # Profil 'quality' (default lama) dipakai sebagai acuan
+            if profile == 'quality':
+                reference = embedding
+            similarity = None
+            if embedding is not None and reference is not None:
+                similarity = round(float(np.dot(embedding, reference)), 6)
+
+            results['profiles'].setdefault(profile, {})[filename] = {
+                **timing,
+                'faces': len(faces),
+                'similarity_to_quality': similarity,
+            }
+
+    write_results(results, args.output)
+
+if __name__ == '__main__':
+    main()
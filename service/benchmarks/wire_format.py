@@ -0,0 +1,71 @@
+"""Body size and peak encoding memory of the json vs multipart wire formats.
+
+Builds a register-faces payload (2 JPEGs + CKKS ciphertext per image) from
+the sample images without running the face model.
+
+Usage (dari folder service/):
+    python -m benchmarks.wire_format [images ...] [--faces N] [--output FILE]
+"""
+import json
+import argparse
+import tracemalloc
+import numpy as np
+import tenseal as ts
+
+from benchmarks.common import load_images, measure, write_results
+
+from utils import TENSEAL_KWARGS, TENSEAL_GLOBAL_SCALE, EMBEDDING_SIZE, normalize_vector
+from upstream import MultipartBody, encode_binary
+
+def build_payload(images: list, faces: int) -> list:
+    context = ts.context(**TENSEAL_KWARGS)
+    context.global_scale = TENSEAL_GLOBAL_SCALE
+    payload = []
+    for i in range(faces):
+        filename, content = images[i % len(images)]
+        embedding = normalize_vector(np.random.rand(EMBEDDING_SIZE).tolist())
+        payload.append({
+            'real_img': content,
+            'rgb_img': content,
+            'filename': filename,
+            'size': len(content),
+            'mime_type': 'image/jpeg',
+            'detection_score': 0.9,
+            'encrypted_embedding': ts.ckks_vector(context, embedding).serialize(),
+        })
+    return payload
+
+def encode_json(payload) -> int:
+    # Sama seperti requests: json.dumps lalu encode ke bytes
+    return len(json.dumps(encode_binary(payload)).encode())
+
+def encode_multipart(payload) -> int:
+    return sum(len(chunk) for chunk in MultipartBody(payload))
+
+def peak_memory(fn, payload) -> int:
+    tracemalloc.start()
+    fn(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('images', nargs='*')
+    parser.add_argument('--faces', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    payload = build_payload(load_images(args.images), args.faces)
+    results = {'faces': args.faces}
+    for name, fn in (('json', encode_json), ('multipart', encode_multipart)):
+        results[name] = {
+            'body_bytes': fn(payload),
+            'peak_encode_bytes': peak_memory(fn, payload),
+            'encode': measure(lambda: fn(payload), args.repeat),
+        }
+    write_results(results, args.output)
+
+if __name__ == '__main__':
+    main()
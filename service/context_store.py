@@ -0,0 +1,330 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import tenseal as ts
+
+from utils import (
+    TEMP_FILE_PATH,
+    CONTEXT_KEY_FILE_NAME,
+    CONTEXT_PROFILE_FILE_NAME,
+    CKKS_PROFILES,
+    LEGACY_CKKS_PROFILE,
+    detect_ckks_profile,
+    CONTEXT_CACHE_MAX_BYTES,
+    CONTEXT_CACHE_TTL,
+)
+
+CONTEXT_SESSION_PATH = os.path.join(TEMP_FILE_PATH, 'sessions')
+
+def session_key_from_token(authorization: str | None) -> str | None:
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode()).hexdigest()
+
+def session_key(request) -> str | None:
+    """Session key for a request, derived from its Authorization token."""
+    return session_key_from_token(request.headers.get('Authorization'))
+
+def context_memory_size(profile: str) -> int:
+    """Estimated in-memory size of a deserialized context with its keys.
+
+    Serialized contexts are compressed, the loaded keys are not: every
+    key-switching key (relin + one per Galois element) holds L-1 ciphertexts
+    of 2 polynomials with N * L 64-bit coefficients, L = number of moduli.
+    """
+    params = CKKS_PROFILES[profile]
+    n = params['poly_modulus_degree']
+    moduli = len(params['coeff_mod_bit_sizes'])
+    poly_bytes = n * moduli * 8
+    # Rotasi +-2^i untuk semua slot (N/2) ditambah konjugasi
+    galois_keys = 2 * (n // 2).bit_length() - 1
+    key_switch_bytes = (moduli - 1) * 2 * poly_bytes
+    # public key (2 polinomial) + secret key
+    return (galois_keys + 1) * key_switch_bytes + 3 * poly_bytes
+
+class ContextEntry:
+    def __init__(self, context: ts.Context, signature, serialized_size: int, profile: str):
+        self.context = context
+        self.signature = signature
+        # Label profil hanya fallback, parameter dibaca dari context
+        self.profile = detect_ckks_profile(context) or profile
+        self.poly_modulus_degree = context.seal_context().data.key_context_data().parms().poly_modulus_degree()
+
+        # Public-only copy (tanpa secret key) untuk dikirim ke backend
+        self.public_context = context.copy()
+        self.public_context.make_context_public()
+        self.serialized_public_context = self.public_context.serialize()
+        self.public_context_fingerprint = hashlib.sha256(self.serialized_public_context).hexdigest()
+
+        # Context + salinan public-nya di memori, ditambah bytes serialisasi
+        self.size = 2 * context_memory_size(self.profile) + serialized_size + len(self.serialized_public_context)
+
+class ContextSession:
+    def __init__(self, filepath: str, last_access: float):
+        self.filepath = filepath
+        self.last_access = last_access
+        self.entry = None
+        # Fingerprint public context yang sudah dimiliki backend
+        self.uploaded_fingerprint = None
+        # User punya wajah yang diregistrasi packed (verify butuh packed_query)
+        self.packed_faces = False
+
+class ContextStore:
+    """Per-session cache of opened TenSEAL contexts.
+
+    Every session (one per Authorization token) keeps its own context file
+    on disk. Deserialized contexts are kept in memory within a byte budget,
+    the least recently used ones are dropped from memory first and reloaded
+    from disk on the next access. Sessions idle longer than the TTL are
+    closed and their context file is removed.
+
+    The files are the shared state between processes (prefork workers): a
+    session unknown in memory is looked up on disk, and the last access is
+    recorded in the mtime of the profile file so every process applies the
+    same TTL.
+    """
+
+    def __init__(self, base_path: str, max_bytes: int, ttl: float):
+        self.base_path = base_path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = {
+            'memory': 0,
+            'expired': 0,
+            'logout': 0,
+        }
+        self._restore_sessions()
+
+    def _filepath(self, key: str) -> str:
+        return os.path.join(self.base_path, key, CONTEXT_KEY_FILE_NAME)
+
+    @staticmethod
+    def _file_signature(filepath: str):
+        try:
+            stat = os.stat(filepath)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    @staticmethod
+    def _profile_filepath(filepath: str) -> str:
+        return os.path.join(os.path.dirname(filepath), CONTEXT_PROFILE_FILE_NAME)
+
+    def _read_profile(self, filepath: str) -> str:
+        try:
+            with open(self._profile_filepath(filepath)) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            # Session dari versi sebelum ada profil
+            return LEGACY_CKKS_PROFILE
+
+    def _last_access(self, filepath: str) -> float | None:
+        """Latest access by any process (mtime of the context or profile file)."""
+        times = []
+        for path in (filepath, self._profile_filepath(filepath)):
+            try:
+                times.append(os.path.getmtime(path))
+            except FileNotFoundError:
+                pass
+        return max(times) if times else None
+
+    def _touch(self, filepath: str, now: float):
+        try:
+            os.utime(self._profile_filepath(filepath), (now, now))
+        except FileNotFoundError:
+            pass
+
+    def _remove_file(self, filepath: str):
+        for path in (filepath, self._profile_filepath(filepath)):
+            if os.path.exists(path):
+                os.remove(path)
+        try:
+            os.rmdir(os.path.dirname(filepath))
+        except OSError:
+            pass
+
+    def _restore_sessions(self):
+        # Context yang masih tersimpan dari proses sebelumnya
+        if not os.path.isdir(self.base_path):
+            return
+        for key in os.listdir(self.base_path):
+            filepath = self._filepath(key)
+            if os.path.isfile(filepath):
+                self._sessions[key] = ContextSession(filepath, self._last_access(filepath))
+        self._sessions = OrderedDict(sorted(self._sessions.items(), key=lambda item: item[1].last_access))
+
+    def _drop_entry(self, session: ContextSession):
+        if session.entry is not None:
+            self._bytes -= session.entry.size
+            session.entry = None
+
+    def _expire(self, now: float):
+        for key, session in list(self._sessions.items()):
+            if now - session.last_access <= self.ttl:
+                # OrderedDict urut berdasarkan akses terakhir
+                break
+            # Bisa saja diakses proses lain
+            last_access = self._last_access(session.filepath)
+            if last_access is not None and now - last_access <= self.ttl:
+                session.last_access = last_access
+                self._sessions.move_to_end(key)
+                continue
+            self._drop_entry(session)
+            self._remove_file(session.filepath)
+            del self._sessions[key]
+            self._evictions['expired'] += 1
+
+    def _adopt(self, key: str, now: float) -> ContextSession | None:
+        """Session saved by another process, from its file on disk."""
+        filepath = self._filepath(key)
+        last_access = self._last_access(filepath)
+        if last_access is None or not os.path.isfile(filepath):
+            return None
+        if now - last_access > self.ttl:
+            self._remove_file(filepath)
+            self._evictions['expired'] += 1
+            return None
+        session = self._sessions[key] = ContextSession(filepath, last_access)
+        return session
+
+    def _enforce_budget(self, keep: str):
+        for key, session in self._sessions.items():
+            if self._bytes <= self.max_bytes:
+                break
+            if key == keep or session.entry is None:
+                continue
+            self._drop_entry(session)
+            self._evictions['memory'] += 1
+
+    def _store_entry(self, key: str, session: ContextSession, entry: ContextEntry):
+        self._drop_entry(session)
+        session.entry = entry
+        self._bytes += entry.size
+        self._enforce_budget(keep=key)
+
+    def save(self, key: str, serialized_context: bytes, profile: str = LEGACY_CKKS_PROFILE) -> ContextEntry:
+        if profile not in CKKS_PROFILES:
+            raise ValueError(f'Unknown CKKS profile: {profile}')
+        context = ts.context_from(serialized_context)
+        profile = detect_ckks_profile(context) or profile
+        filepath = self._filepath(key)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        # Profil ditulis sebelum context, perubahan dideteksi dari signature file context
+        with open(self._profile_filepath(filepath), 'w') as f:
+            f.write(profile)
+        with open(filepath, 'wb') as f:
+            f.write(serialized_context)
+        entry = ContextEntry(context, self._file_signature(filepath), len(serialized_context), profile)
+
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            session = self._sessions.get(key) or ContextSession(filepath, now)
+            session.last_access = now
+            self._sessions[key] = session
+            self._sessions.move_to_end(key)
+            self._store_entry(key, session, entry)
+            return entry
+
+    def get(self, key: str | None) -> ContextEntry | None:
+        if key is None:
+            return None
+
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            session = self._sessions.get(key) or self._adopt(key, now)
+            if session is None:
+                self._misses += 1
+                return None
+
+            session.last_access = now
+            self._sessions.move_to_end(key)
+            self._touch(session.filepath, now)
+            signature = self._file_signature(session.filepath)
+            if signature is None:
+                self._drop_entry(session)
+                del self._sessions[key]
+                self._misses += 1
+                return None
+
+            if session.entry is not None and session.entry.signature == signature:
+                self._hits += 1
+                return session.entry
+            self._misses += 1
+
+        # Deserialisasi di luar lock agar session lain tidak ikut tertahan
+        with open(session.filepath, 'rb') as f:
+            serialized_context = f.read()
+        profile = self._read_profile(session.filepath)
+        entry = ContextEntry(ts.context_from(serialized_context), signature, len(serialized_context), profile)
+
+        with self._lock:
+            if self._sessions.get(key) is session:
+                self._store_entry(key, session, entry)
+        return entry
+
+    def exists(self, key: str | None) -> bool:
+        if key is None:
+            return False
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            session = self._sessions.get(key) or self._adopt(key, now)
+            return session is not None and os.path.isfile(session.filepath)
+
+    def context_uploaded(self, key: str | None, fingerprint: str) -> bool:
+        with self._lock:
+            session = self._sessions.get(key)
+            return session is not None and session.uploaded_fingerprint == fingerprint
+
+    def mark_context_uploaded(self, key: str | None, fingerprint: str | None):
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                session.uploaded_fingerprint = fingerprint
+
+    def has_packed_faces(self, key: str | None) -> bool:
+        with self._lock:
+            session = self._sessions.get(key)
+            return session is not None and session.packed_faces
+
+    def mark_packed_faces(self, key: str | None):
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                session.packed_faces = True
+
+    def evict(self, key: str | None):
+        if key is None:
+            return
+        with self._lock:
+            session = self._sessions.pop(key, None)
+            if session is not None:
+                self._drop_entry(session)
+            # File tetap dihapus walau session dibuka di proses lain
+            filepath = self._filepath(key)
+            if session is not None or os.path.isfile(filepath):
+                self._remove_file(filepath)
+                self._evictions['logout'] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'loaded': sum(1 for session in self._sessions.values() if session.entry is not None),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': dict(self._evictions),
+            }
+
+context_store = ContextStore(CONTEXT_SESSION_PATH, CONTEXT_CACHE_MAX_BYTES, CONTEXT_CACHE_TTL)
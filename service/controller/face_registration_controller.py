@@ -1,29 +1,43 @@
 import os
-import base64
+import mimetypes
 import traceback
-import requests
 from flask import (
     Blueprint,
     jsonify,
     request,
+    g,
     current_app as app,
     Response,
     stream_with_context,
 )
-import cv2
 import numpy as np
 import tenseal as ts
 
-from face_analysis import model
+from face_analysis import get_main_face
 
 from utils import (
-    allowed_file,
-    BASE_API_URL,
-    TEMP_FILE_PATH,
-    CONTEXT_KEY_FILE_NAME,
+    read_upload,
+    InvalidUpload,
     preprocess_image,
+    encode_image,
+    crop_thumbnail,
+    REGISTRATION_PREPROCESS_PROFILE,
+    RGB_IMG_MODE,
+    RGB_IMG_FORMAT,
     normalize_vector,
+    is_truthy,
+    pack_embeddings,
+    packed_capacity,
+    EMBEDDING_SIZE,
+    PACKED_EMBEDDINGS,
+    REGISTER_PARALLEL,
+    REGISTER_MAX_WORKERS_PER_REQUEST,
+    MIN_DETECTION_SCORE,
 )
+from context_store import context_store, session_key
+from worker_pool import ordered_map
+from metrics import StageTimer
+from upstream import proxy, request_upstream, post_payload, forward_headers, STREAM_CHUNK_SIZE
 
 face_registration_controller = Blueprint('face_registration_controller', __name__, url_prefix='/face-registration')
 
@@ -31,120 +45,199 @@ face_registration_controller = Blueprint('face_registration_controller', __name_
 def index():
     return jsonify({'message': 'Hello World'})
 
+class ImageRejected(Exception):
+    def __init__(self, body: dict, status: int = 400):
+        super().__init__(body.get('message') or body.get('error'))
+        self.body = body
+        self.status = status
+
+def process_image(context, file, file_content: bytes, packed: bool, timer: StageTimer):
+    """Run the full pipeline for one uploaded (already validated) image.
+
+    Runs on the image worker pool, so it must not touch the Flask app or
+    request context. Raises ImageRejected when no usable face is found.
+    """
+    file_content_size = len(file_content)
+
+    # dapatkan base filename
+    (filename, extension) = os.path.splitext(file.filename)
+    file_bytes = np.frombuffer(file_content, np.uint8)
+    preprocess_result = preprocess_image(file_bytes, filename, extension, REGISTRATION_PREPROCESS_PROFILE, timer)
+    main_face = get_main_face(preprocess_result['rgb_img'], MIN_DETECTION_SCORE, timer)
+
+    if main_face is None:
+        raise ImageRejected({
+            'error': True,
+            'message': 'Face not found',
+            'data': None
+        })
+    
+    detection_score = float(main_face.det_score)
+
+    if main_face.det_score < MIN_DETECTION_SCORE:
+        raise ImageRejected({
+            'error': True,
+            'message': 'Low detection score',
+            'data': {
+                'detection_score': detection_score,
+                'filename': file.filename
+            },
+        })
+    
+    # File upload diteruskan apa adanya, hanya rgb_img yang di-encode
+    real_img = file_content
+    rgb_extension = RGB_IMG_FORMAT or extension
+    with timer.stage('encode'):
+        if RGB_IMG_MODE == 'thumbnail':
+            rgb_img = encode_image(crop_thumbnail(preprocess_result['rgb_img'], main_face.bbox), rgb_extension)
+        else:
+            rgb_img = encode_image(preprocess_result['rgb_img'], rgb_extension)
+
+    # Normalize to unit vector (optimize cosine sim to dot product)
+    with timer.stage('normalize'):
+        face_embedding = main_face.embedding.tolist()
+        face_embedding_normalized = normalize_vector(face_embedding)
+
+    # Ekstraksi fitur-fitur
+    response_data = {
+        'real_img': real_img,
+        'rgb_img': rgb_img,
+        'filename': file.filename,
+        'size': file_content_size,
+        'mime_type': file.mimetype,
+        'rgb_mime_type': mimetypes.guess_type(f'{filename}.{rgb_extension.lstrip(".")}')[0],
+        'detection_score': detection_score,
+        # 'gender': 'Male' if main_face.gender == 1 else 'Female',
+        # 'age': int(main_face.age),
+        # 'bbox': {
+        #     'x1': float(main_face.bbox[0]),
+        #     'y1': float(main_face.bbox[1]),
+        #     'x2': float(main_face.bbox[2]),
+        #     'y2': float(main_face.bbox[3])
+        # }
+    }
+    if not packed:
+        with timer.stage('encrypt'):
+            encrypted_vector = ts.ckks_vector(context, face_embedding_normalized)
+        with timer.stage('serialize'):
+            response_data['encrypted_embedding'] = encrypted_vector.serialize()
+
+    return response_data, face_embedding_normalized
+
 @face_registration_controller.route('/register-faces', methods=['POST'])
 def register_faces():
     try:
         files = request.files.getlist('images')
-        context_exists = os.path.isfile(f'{TEMP_FILE_PATH}/{CONTEXT_KEY_FILE_NAME}')
+        max_content_length = app.config['MAX_CONTENT_LENGTH']
+        timer = g.stage_timer = StageTimer('register')
 
-        if not context_exists:
+        # Validasi semua file dulu, satu file invalid = seluruh batch ditolak
+        uploads = []
+        for file in files:
+            try:
+                uploads.append((file, read_upload(file, max_content_length)))
+            except InvalidUpload as e:
+                return jsonify({
+                    'error': True,
+                    'message': e.message,
+                    'data': {'filename': file.filename},
+                }), e.status
+
+        with timer.stage('context'):
+            context_entry = context_store.get(session_key(request))
+
+        if context_entry is None:
             return jsonify({
                 'error': True,
                 'message': 'TenSEAL context not found',
                 'data': None,
             }), 404
         
-        with open(f'{TEMP_FILE_PATH}/{CONTEXT_KEY_FILE_NAME}', 'rb') as f:
-            context = ts.context_from(f.read())
+        context = context_entry.context
+        packed = is_truthy(request.form.get('packed', PACKED_EMBEDDINGS))
+
+        max_workers = REGISTER_MAX_WORKERS_PER_REQUEST if REGISTER_PARALLEL else 1
 
         payload = []
-        
-        for file in files:
-            if not allowed_file(file.filename):
-                return jsonify({'error': 'Invalid file format'}), 400
-            
-            file_content = file.read()
-            file_content_size = len(file_content)
-            # Cek ukuran file
-            if file_content_size > app.config['MAX_CONTENT_LENGTH'] or file.content_length > app.config['MAX_CONTENT_LENGTH']:
-                return jsonify({'error': 'File too large'}), 400
-
-            # dapatkan base filename
-            (filename, extension) = os.path.splitext(file.filename)
-            file_bytes = np.frombuffer(file_content, np.uint8)
-            preprocess_result = preprocess_image(file_bytes, filename, extension)
-            faces = model.get(preprocess_result['rgb_img'])
-
-            if not faces:
-                return jsonify({
-                    'error': True,
-                    'message': 'Face not found',
-                    'data': None
-                }), 400
-            
-            main_face = faces[0]
-            detection_score = float(main_face.det_score)
-
-            if main_face.det_score < 0.3:
-                return jsonify({
-                    'error': True,
-                    'message': 'Low detection score',
-                    'data': {
-                        'detection_score': detection_score,
-                        'filename': file.filename
-                    },
-                }), 400
-            
-            if extension.lower() == '.jpeg':
-                extension = '.jpg'
-            
-            _, real_encoded = cv2.imencode(extension.lower(), preprocess_result['real_img'])
-            __, rgb_encoded = cv2.imencode(extension.lower(), preprocess_result['rgb_img'])
-            
-            real_img = real_encoded.tobytes()
-            rgb_img = rgb_encoded.tobytes()
-
-            # Normalize to unit vector (optimize cosine sim to dot product)
-            face_embedding = main_face.embedding.tolist()
-            face_embedding_normalized = normalize_vector(face_embedding)
-
-            encrypted_embedding = ts.ckks_vector(context, face_embedding_normalized).serialize()
-
-            # Ekstraksi fitur-fitur
-            response_data = {
-                'real_img': base64.b64encode(real_img).decode(),
-                'rgb_img': base64.b64encode(rgb_img).decode(),
-                'filename': file.filename,
-                'size': file_content_size,
-                'mime_type': file.mimetype,
-                'encrypted_embedding': base64.b64encode(encrypted_embedding).decode(),
-                'detection_score': detection_score,
-                # 'gender': 'Male' if main_face.gender == 1 else 'Female',
-                # 'age': int(main_face.age),
-                # 'bbox': {
-                #     'x1': float(main_face.bbox[0]),
-                #     'y1': float(main_face.bbox[1]),
-                #     'x2': float(main_face.bbox[2]),
-                #     'y2': float(main_face.bbox[3])
-                # }
-            }
-            payload.append(response_data)
-
-        headers = dict(request.headers)
-        headers['Content-Type'] = 'application/json'
-        response = requests.post(
-            f'{BASE_API_URL}/user/face-registration/register-faces',
-            headers=headers,
-            json=payload
+        embeddings = []
+
+        results = ordered_map(
+            lambda upload: process_image(context, upload[0], upload[1], packed, timer),
+            uploads,
+            max_workers,
         )
-        resp_json = response.json()
+        try:
+            for (response_data, face_embedding_normalized) in results:
+                if packed:
+                    embeddings.append(face_embedding_normalized)
+                payload.append(response_data)
+        except ImageRejected as e:
+            return jsonify(e.body), e.status
+
+        if packed:
+            with timer.stage('encrypt'):
+                payload = pack_faces(context, payload, embeddings, context_entry.poly_modulus_degree)
+
+        # Gambar & ciphertext berupa bytes, di-encode sesuai WIRE_FORMAT
+        with timer.stage('upstream'):
+            response = post_payload(
+                '/user/face-registration/register-faces',
+                payload,
+                forward_headers(request.headers),
+            )
+            resp_json = response.json()
+        if packed and response.ok:
+            context_store.mark_packed_faces(session_key(request))
         return jsonify(resp_json), response.status_code
     except Exception as e:
         print(traceback.format_exc())
         return jsonify({'error': True, 'message': str(e)}), 500
     
+def pack_faces(context, faces: list, embeddings: list, poly_modulus_degree: int) -> dict:
+    """Encrypt several embeddings per CKKS vector and record their slot layout.
+
+    Every vector is zero-padded to `capacity` embeddings. At verification
+    the backend multiplies it slot-wise with the query tiled `capacity`
+    times (packed_query) and returns the product; the service decrypts it
+    and sums the EMBEDDING_SIZE slots of each face (see decrypt_results).
+    """
+    capacity = packed_capacity(poly_modulus_degree)
+    packed_embeddings = []
+
+    slots = capacity * EMBEDDING_SIZE
+
+    for index, (flat_vector, offsets) in enumerate(pack_embeddings(embeddings, capacity)):
+        # Selalu penuh (padding 0) agar ukurannya sama dengan query tiled saat verifikasi
+        flat_vector = flat_vector + [0.0] * (slots - len(flat_vector))
+        encrypted_embedding = ts.ckks_vector(context, flat_vector).serialize()
+        first_face = index * capacity
+        slot_layout = []
+        for face_index, offset in enumerate(offsets, start=first_face):
+            faces[face_index]['packed_embedding'] = {
+                'index': index,
+                'offset': offset,
+            }
+            slot_layout.append({
+                'filename': faces[face_index]['filename'],
+                'offset': offset,
+            })
+        packed_embeddings.append({
+            'encrypted_embedding': encrypted_embedding,
+            'embedding_size': EMBEDDING_SIZE,
+            'slots': slots,
+            'slot_layout': slot_layout,
+        })
+
+    return {
+        'packing': 'ckks-slots',
+        'faces': faces,
+        'packed_embeddings': packed_embeddings,
+    }
+
 @face_registration_controller.route('/get-registered-faces', methods=['GET'])
 def get_registered_faces():
     try:
-        response = requests.get(
-            f'{BASE_API_URL}/user/face-registration/get-registered-faces',
-            headers=request.headers
-        )
-
-        excluded_headers = ['content-encoding', 'transfer-encoding', 'content-length', 'connection']
-        headers_to_send = [(name, value) for (name, value) in response.raw.headers.items()
-                        if name.lower() not in excluded_headers]
-        return Response(response.content, response.status_code, headers_to_send)
+        return proxy('/user/face-registration/get-registered-faces')
     except Exception as e:
         return jsonify({'error': True, 'message': str(e)}), 500
     
@@ -154,17 +247,19 @@ def get_registered_face_content(registered_face_id):
     if 'Authorization' in request.headers:
         forwarded_headers['Authorization'] = request.headers['Authorization']
 
-    response = requests.get(
-        f'{BASE_API_URL}/user/face-registration/registered-face/{registered_face_id}',
+    response = request_upstream(
+        'GET',
+        f'/user/face-registration/registered-face/{registered_face_id}',
         headers=forwarded_headers,
         stream=True
     )
 
     if response.status_code != 200:
+        response.close()
         return jsonify({'error': True, 'message': 'Picture not found'}), 404
     
     return Response(
-        stream_with_context(response.iter_content(chunk_size=4096)),
+        stream_with_context(response.iter_content(chunk_size=STREAM_CHUNK_SIZE)),
         content_type=response.headers.get('Content-Type', 'application/octet-stream'),
         status=response.status_code
     )
@@ -1,34 +1,208 @@
 import os
 import base64
 import traceback
-import requests
 from flask import (
     Blueprint,
     jsonify,
     request,
+    g,
     current_app as app,
-    Response,
-    stream_with_context,
 )
-import cv2
 import numpy as np
 import tenseal as ts
 
-from face_analysis import model
+from face_analysis import (
+    get_main_face,
+    detect_primary_face,
+    embed_face,
+    face_sharpness,
+    frame_score,
+)
 
 from utils import (
-    allowed_file,
-    BASE_API_URL,
-    TEMP_FILE_PATH,
-    CONTEXT_KEY_FILE_NAME,
+    read_upload,
+    InvalidUpload,
     preprocess_image,
+    VERIFICATION_PREPROCESS_PROFILE,
     normalize_vector,
-    TENSEAL_KWARGS,
-    TENSEAL_GLOBAL_SCALE,
+    PUBLIC_CONTEXT_REUSE,
+    multiplicative_depth,
+    packed_capacity,
+    EMBEDDING_SIZE,
+    FACE_SELECTION,
+    BURST_MAX_FRAMES,
+    BURST_MAX_WORKERS_PER_REQUEST,
 )
+from context_store import context_store, session_key
+from worker_pool import ordered_map
+from upstream import post_payload, forward_headers
+from metrics import StageTimer
 
 face_verification_controller = Blueprint('face_verification_controller', __name__, url_prefix='/face-verification')
 
+# Balasan backend (409) jika fingerprint public context tidak dikenal
+CONTEXT_MISSING = 'context_missing'
+# Balasan backend (409) jika user punya wajah packed tapi packed_query tidak dikirim
+PACKED_QUERY_MISSING = 'packed_query_missing'
+
+def conflict_reason(response) -> str | None:
+    """`data.reason` of a 409 from the backend, None for any other response."""
+    if response.status_code != 409:
+        return None
+    try:
+        body = response.json()
+    except ValueError:
+        # 409 dari proxy/gateway, bukan JSON backend
+        return None
+    data = body.get('data') if isinstance(body, dict) else None
+    return data.get('reason') if isinstance(data, dict) else None
+
+def context_missing(response) -> bool:
+    return conflict_reason(response) == CONTEXT_MISSING
+
+def send_verification(payload: dict, context_entry, key: str, headers: dict):
+    """POST to the verify endpoint, uploading the public context only when needed.
+
+    With PUBLIC_CONTEXT_REUSE the context is sent once per session; later
+    requests carry only its fingerprint and the context is re-sent if the
+    backend reports it missing.
+    """
+    if not PUBLIC_CONTEXT_REUSE:
+        payload['ctx'] = context_entry.serialized_public_context
+        return post_payload('/user/face-verification/verify', payload, headers)
+
+    fingerprint = context_entry.public_context_fingerprint
+    payload['ctx_fingerprint'] = fingerprint
+    if not context_store.context_uploaded(key, fingerprint):
+        payload['ctx'] = context_entry.serialized_public_context
+    response = post_payload('/user/face-verification/verify', payload, headers)
+
+    if 'ctx' not in payload and context_missing(response):
+        payload['ctx'] = context_entry.serialized_public_context
+        response = post_payload('/user/face-verification/verify', payload, headers)
+
+    # packed_query_missing: context sudah diterima backend
+    if response.ok or conflict_reason(response) == PACKED_QUERY_MISSING:
+        context_store.mark_context_uploaded(key, fingerprint)
+    return response
+
+def decrypt_results(context, data, timer: StageTimer) -> list:
+    """Decrypt verification scores in one pass.
+
+    `data` is either a packed result ({'packed': <b64>, 'count': n}) whose
+    slot i holds the score of registered face i, or a list which is decoded
+    and deserialized before decrypting. An item of the list is a
+    single-score ciphertext, or for faces registered packed the slot-wise
+    product with the tiled query ({'product': <b64>, 'offsets': [...]})
+    where the score of a face is the sum of its EMBEDDING_SIZE slots.
+    """
+    if isinstance(data, dict):
+        with timer.stage('result_decode'):
+            encrypted_result = base64.b64decode(data['packed'])
+        with timer.stage('result_deserialize'):
+            result_vector = ts.ckks_vector_from(context, encrypted_result)
+        with timer.stage('decrypt'):
+            return result_vector.decrypt()[:data['count']]
+
+    with timer.stage('result_decode'):
+        encrypted_results = [base64.b64decode(result['product'] if isinstance(result, dict) else result)
+                             for result in data]
+    with timer.stage('result_deserialize'):
+        result_vectors = [ts.ckks_vector_from(context, result) for result in encrypted_results]
+    with timer.stage('decrypt'):
+        results = []
+        for result, result_vector in zip(data, result_vectors):
+            values = result_vector.decrypt()
+            if isinstance(result, dict):
+                embedding_size = result.get('embedding_size', EMBEDDING_SIZE)
+                results.extend(sum(values[offset:offset + embedding_size]) for offset in result['offsets'])
+            else:
+                results.append(values[0])
+        return results
+
+def verify_face(context_entry, key: str, main_face, result_mode: str, timer: StageTimer, extra: dict | None = None):
+    """Encrypt the face embedding, verify it upstream and decrypt the scores."""
+    context = context_entry.context
+    # Dot product + pack_vectors di backend butuh 2 level perkalian (hanya v1)
+    if result_mode == 'packed' and multiplicative_depth(context_entry.profile) < 2:
+        return jsonify({
+            'error': True,
+            'message': f'result_mode=packed is not supported by context profile {context_entry.profile}',
+            'data': None,
+        }), 400
+    with timer.stage('normalize'):
+        face_embedding = main_face.embedding.tolist()
+        face_embedding_normalized = normalize_vector(face_embedding)
+    with timer.stage('encrypt'):
+        encrypted_vector = ts.ckks_vector(context, face_embedding_normalized)
+    with timer.stage('serialize'):
+        encrypted_embedding = encrypted_vector.serialize()
+
+    payload = {
+        'encrypted_embedding': encrypted_embedding,
+    }
+
+    def add_packed_query():
+        # Query diulang di setiap offset, untuk wajah yang diregistrasi packed
+        capacity = packed_capacity(context_entry.poly_modulus_degree)
+        with timer.stage('encrypt'):
+            packed_query = ts.ckks_vector(context, face_embedding_normalized * capacity)
+        with timer.stage('serialize'):
+            payload['packed_query'] = packed_query.serialize()
+
+    if context_store.has_packed_faces(key):
+        add_packed_query()
+    if result_mode == 'packed':
+        # Minta backend mengembalikan semua skor dalam satu ciphertext
+        payload['result_mode'] = 'packed'
+
+    with timer.stage('upstream'):
+        response = send_verification(payload, context_entry, key, forward_headers(request.headers))
+    if 'packed_query' not in payload and conflict_reason(response) == PACKED_QUERY_MISSING:
+        # Wajah diregistrasi packed di session/deployment lain
+        add_packed_query()
+        with timer.stage('upstream'):
+            response = send_verification(payload, context_entry, key, forward_headers(request.headers))
+    if response.ok and 'packed_query' in payload:
+        context_store.mark_packed_faces(key)
+    resp_json = response.json()
+
+    if resp_json['error']:
+        return jsonify(resp_json), response.status_code
+    
+    data = resp_json['data']
+
+    results = decrypt_results(context, data, timer)
+    return jsonify({
+        'error': False,
+        'message': 'Face found',
+        'data': results,
+        'timings': timer.milliseconds(),
+        **(extra or {}),
+    })
+
+def screen_frame(frame, file_content: bytes, timer: StageTimer) -> dict | None:
+    """Cheap pass over one frame of a burst: decode, resize and detection only.
+
+    Runs on the image worker pool. Returns None when the frame has no face.
+    """
+    (filename, extension) = os.path.splitext(frame.filename)
+    file_bytes = np.frombuffer(file_content, np.uint8)
+    rgb_img = preprocess_image(file_bytes, filename, extension, 'none', timer)['rgb_img']
+    face = detect_primary_face(rgb_img, timer)
+    if face is None:
+        return None
+
+    with timer.stage('frame_quality'):
+        sharpness = face_sharpness(rgb_img, face.bbox)
+        score = frame_score(face.bbox, face.det_score, sharpness, rgb_img.shape)
+    return {
+        'rgb_img': rgb_img,
+        'face': face,
+        'sharpness': sharpness,
+        'score': score,
+    }
+
 @face_verification_controller.route('/', methods=['GET'])
 def index_get():
     return jsonify({'message': 'Hello World'})
@@ -37,72 +211,128 @@ def index_get():
 def index_post():
     try:
         captured_image = request.files['captured_image']
-        context_exists = os.path.isfile(f'{TEMP_FILE_PATH}/{CONTEXT_KEY_FILE_NAME}')
+        timer = g.stage_timer = StageTimer('verify')
+        try:
+            file_content = read_upload(captured_image, app.config['MAX_CONTENT_LENGTH'])
+        except InvalidUpload as e:
+            return jsonify({'error': True, 'message': e.message, 'data': None}), e.status
+
+        key = session_key(request)
+        with timer.stage('context'):
+            context_entry = context_store.get(key)
 
-        if not context_exists:
+        if context_entry is None:
             return jsonify({
                 'error': True,
                 'message': 'TenSEAL context not found',
                 'data': None,
             }), 404
         
-        with open(f'{TEMP_FILE_PATH}/{CONTEXT_KEY_FILE_NAME}', 'rb') as f:
-            context = ts.context_from(f.read())
+        result_mode = request.form.get('result_mode', 'single')
 
-        file_content = captured_image.read()
         (filename, extension) = os.path.splitext(captured_image.filename)
         file_bytes = np.frombuffer(file_content, np.uint8)
-        preprocess_result = preprocess_image(file_bytes, filename, extension)
-        faces = model.get(preprocess_result['rgb_img'])
+        preprocess_result = preprocess_image(file_bytes, filename, extension, VERIFICATION_PREPROCESS_PROFILE, timer)
+        main_face = get_main_face(preprocess_result['rgb_img'], timer=timer)
 
-        if not faces:
+        if main_face is None:
             return jsonify({
                 'error': True,
                 'message': 'Face not found',
                 'data': None
             }), 400
         
-        main_face = faces[0]
-        face_embedding = main_face.embedding.tolist()
-        face_embedding_normalized = normalize_vector(face_embedding)
-        encrypted_embedding = ts.ckks_vector(context, face_embedding_normalized).serialize()
+        return verify_face(context_entry, key, main_face, result_mode, timer)
+    except Exception as e:
+        print(traceback.format_exc())
+        return jsonify({'error': True, 'message': str(e)}), 500
 
-        context.make_context_public()
-        context = context.serialize()
+@face_verification_controller.route('/burst', methods=['POST'])
+def burst_post():
+    """Verify the best of several frames (a short burst from the camera).
 
-        payload = {
-            'encrypted_embedding': base64.b64encode(encrypted_embedding).decode(),
-            'ctx': base64.b64encode(context).decode()
-        }
+    Every frame only goes through decode, resize and detection. The frame
+    whose face scores best on detection score, size and sharpness is the
+    only one that is embedded, encrypted and sent to the backend.
+    """
+    try:
+        frames = request.files.getlist('captured_images')
+        timer = g.stage_timer = StageTimer('verify_burst')
+        if not frames:
+            return jsonify({'error': True, 'message': 'No frames uploaded', 'data': None}), 400
+        if len(frames) > BURST_MAX_FRAMES:
+            return jsonify({
+                'error': True,
+                'message': f'Too many frames (max {BURST_MAX_FRAMES})',
+                'data': None,
+            }), 400
 
-        headers = dict(request.headers)
-        headers['Content-Type'] = 'application/json'
-        response = requests.post(
-            f'{BASE_API_URL}/user/face-verification/verify',
-            headers=headers,
-            json=payload
-        )
+        uploads = []
+        for frame in frames:
+            try:
+                uploads.append((frame, read_upload(frame, app.config['MAX_CONTENT_LENGTH'])))
+            except InvalidUpload as e:
+                return jsonify({
+                    'error': True,
+                    'message': e.message,
+                    'data': {'filename': frame.filename},
+                }), e.status
 
-        resp_json = response.json()
+        key = session_key(request)
+        with timer.stage('context'):
+            context_entry = context_store.get(key)
 
-        if resp_json['error']:
-            return jsonify(resp_json), response.status_code
-        
-        data = resp_json['data']
-        with open(f'{TEMP_FILE_PATH}/{CONTEXT_KEY_FILE_NAME}', 'rb') as f:
-            context = ts.context_from(f.read())
+        if context_entry is None:
+            return jsonify({
+                'error': True,
+                'message': 'TenSEAL context not found',
+                'data': None,
+            }), 404
 
-        results = []
-        for result in data:
-            encrypted_cosine_sim_res = base64.b64decode(result)
-            result_vector = ts.ckks_vector_from(context, encrypted_cosine_sim_res)
-            decrypted_result = result_vector.decrypt()[0]
-            results.append(decrypted_result)
+        result_mode = request.form.get('result_mode', 'single')
 
-        return jsonify({
-            'error': False,
-            'message': 'Face found',
-            'data': results,
+        screened = list(ordered_map(
+            lambda upload: screen_frame(upload[0], upload[1], timer),
+            uploads,
+            BURST_MAX_WORKERS_PER_REQUEST,
+        ))
+        candidates = [index for (index, result) in enumerate(screened) if result is not None]
+        if not candidates:
+            return jsonify({
+                'error': True,
+                'message': 'Face not found',
+                'data': {'frames': len(frames)},
+            }), 400
+
+        best_index = max(candidates, key=lambda index: screened[index]['score'])
+        best = screened[best_index]
+        (frame, file_content) = uploads[best_index]
+
+        if VERIFICATION_PREPROCESS_PROFILE == 'none' and FACE_SELECTION == 'primary':
+            # Gambar & deteksi dari tahap seleksi sudah sama dengan pipeline verifikasi
+            main_face = embed_face(best['rgb_img'], best['face'], timer)
+        else:
+            (filename, extension) = os.path.splitext(frame.filename)
+            file_bytes = np.frombuffer(file_content, np.uint8)
+            preprocess_result = preprocess_image(file_bytes, filename, extension, VERIFICATION_PREPROCESS_PROFILE, timer)
+            main_face = get_main_face(preprocess_result['rgb_img'], timer=timer)
+
+        if main_face is None:
+            return jsonify({
+                'error': True,
+                'message': 'Face not found',
+                'data': {'frames': len(frames)},
+            }), 400
+
+        return verify_face(context_entry, key, main_face, result_mode, timer, {
+            'frame': {
+                'index': best_index,
+                'filename': frame.filename,
+                'detection_score': float(best['face'].det_score),
+                'sharpness': round(best['sharpness'], 3),
+                'score': round(best['score'], 6),
+            },
+            'frames': len(frames),
         })
     except Exception as e:
         print(traceback.format_exc())
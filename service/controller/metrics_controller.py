@@ -0,0 +1,46 @@
+from flask import Blueprint, Response
+
+import face_analysis
+from context_store import context_store
+from opened_context_cache import opened_context_cache
+from metrics import render_metrics
+
+metrics_controller = Blueprint('metrics_controller', __name__)
+
+def gauge(name: str, documentation: str, value) -> list:
+    return [
+        f'# HELP {name} {documentation}',
+        f'# TYPE {name} gauge',
+        f'{name} {value}',
+    ]
+
+def counter(name: str, documentation: str, value, label: str | None = None) -> list:
+    """Counter `name`; with `label`, `value` is a dict of label value -> count."""
+    lines = [
+        f'# HELP {name} {documentation}',
+        f'# TYPE {name} counter',
+    ]
+    if label is None:
+        return lines + [f'{name} {value}']
+    return lines + [f'{name}{{{label}="{key}"}} {count}' for (key, count) in sorted(value.items())]
+
+@metrics_controller.route('/metrics', methods=['GET'])
+def metrics():
+    cache_stats = context_store.stats()
+    lines = gauge('context_cache_sessions', 'Open TenSEAL context sessions.', cache_stats['sessions']) + \
+        gauge('context_cache_bytes', 'Memory used by loaded TenSEAL contexts.', cache_stats['bytes']) + \
+        counter('context_cache_hits_total', 'Context lookups served from memory.', cache_stats['hits']) + \
+        counter('context_cache_misses_total', 'Context lookups that were not in memory.', cache_stats['misses']) + \
+        counter('context_cache_evictions_total', 'Context sessions evicted, by reason (memory, expired, logout).',
+                cache_stats['evictions'], label='reason')
+
+    opened_stats = opened_context_cache.stats()
+    lines += gauge('opened_context_cache_entries', 'Cached derived keys of opened context keys.', opened_stats['entries']) + \
+        gauge('opened_context_cache_bytes', 'Memory used by cached decrypted contexts.', opened_stats['bytes'])
+
+    batcher = face_analysis.recognition_batcher
+    if batcher is not None:
+        lines += gauge('recognition_batcher_queue_depth', 'Faces waiting for batched recognition.',
+                       batcher.stats()['queue_depth'])
+
+    return Response(render_metrics(lines), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,29 @@
+from flask import Blueprint, jsonify
+
+import face_analysis
+
+status_controller = Blueprint('status_controller', __name__, url_prefix='/status')
+
+@status_controller.route('/inference', methods=['GET'])
+def inference():
+    batcher = face_analysis.recognition_batcher
+    return jsonify({
+        'error': False,
+        'message': '',
+        'data': {
+            'batching': batcher is not None,
+            'scheduler': batcher.stats() if batcher is not None else None,
+        },
+    })
+
+@status_controller.route('/ready', methods=['GET'])
+def ready():
+    is_ready = face_analysis.is_ready()
+    return jsonify({
+        'error': False,
+        'message': '' if is_ready else 'Face model is warming up',
+        'data': {
+            'ready': is_ready,
+            'modules': list(face_analysis.model.models.keys()) if face_analysis.model is not None else [],
+        },
+    }), 200 if is_ready else 503
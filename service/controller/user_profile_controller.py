@@ -17,20 +17,33 @@ from cryptography.hazmat.primitives.kdf.argon2 import Argon2id
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
 import tenseal as ts
-import requests
 
 from utils import (
-    BASE_API_URL,
     ARGON2ID_KWARGS,
-    TENSEAL_KWARGS,
-    TEMP_FILE_PATH,
-    CONTEXT_KEY_FILE_NAME,
     ARGON_SALT_LEN,
     AESGCM_NONCE_LEN,
-    TENSEAL_GLOBAL_SCALE,
+    CKKS_PROFILES,
+    CKKS_PROFILE,
+    LEGACY_CKKS_PROFILE,
+    create_ckks_context,
 )
+from context_store import context_store, session_key
+from opened_context_cache import opened_context_cache
+from upstream import proxy, request_upstream, forward_headers
 
 user_profile_controller = Blueprint('user_profile_controller', __name__, url_prefix='/user-profile')
+
+def derive_context_key(mnemonic_phrase: str, argon_salt: bytes) -> bytes:
+    """AES-GCM key of the saved context, derived from the mnemonic phrase."""
+    mnemonic_phrase_seed = mnemonic.Mnemonic('english').to_seed(mnemonic_phrase)
+    kdf = Argon2id(
+        **ARGON2ID_KWARGS,
+        salt=argon_salt,
+        ad=None,
+        secret=None,
+    )
+    return kdf.derive(mnemonic_phrase_seed)
+
 @user_profile_controller.before_request
 def before_request():
     if 'Authorization' not in request.headers:
@@ -63,43 +76,27 @@ def update():
             data['phone_number'] = data['phoneNumber']
             del data['phoneNumber']
 
-        response = requests.put(
-            f'{BASE_API_URL}/user/profile/update/{data['user_id']}',
-            json=data,
-            headers=request.headers
-        )
-
-        excluded_headers = ['content-encoding', 'transfer-encoding', 'content-length', 'connection']
-        headers_to_send = [(name, value) for (name, value) in response.raw.headers.items()
-                        if name.lower() not in excluded_headers]
-        return Response(response.content, response.status_code, headers_to_send)
+        return proxy(f'/user/profile/update/{data["user_id"]}', json=data)
     except Exception as e:
         return jsonify({'error': True, 'message': str(e)}), 500
 
 @user_profile_controller.route('/generate-context-key', methods=['POST'])
 def generate_context_key():
     try:
-        context = ts.context(**TENSEAL_KWARGS)
-        context.global_scale = TENSEAL_GLOBAL_SCALE,
-        context.generate_galois_keys()
-        context.generate_relin_keys()
+        input = request.get_json(silent=True) or {}
+        context_profile = input.get('context_profile', CKKS_PROFILE)
+        if context_profile not in CKKS_PROFILES:
+            return jsonify({'error': True, 'message': f'Unknown context profile: {context_profile}'}), 400
+
+        context = create_ckks_context(context_profile)
 
         serialized_context = context.serialize(save_public_key=True, save_secret_key=True, save_galois_keys=True, save_relin_keys=True)
 
         mnemo = mnemonic.Mnemonic('english')
         mnemonic_phrase = mnemo.generate(strength=256)
-        mnemonic_phrase_seed = mnemo.to_seed(mnemonic_phrase)
 
         argon_salt = os.urandom(ARGON_SALT_LEN)
-
-        kdf = Argon2id(
-            **ARGON2ID_KWARGS,
-            salt=argon_salt,
-            ad=None,
-            secret=None,
-        )
-
-        key = kdf.derive(mnemonic_phrase_seed)
+        key = derive_context_key(mnemonic_phrase, argon_salt)
 
         aesgcm_nonce = os.urandom(AESGCM_NONCE_LEN)
 
@@ -107,14 +104,19 @@ def generate_context_key():
         encrypted_context = aesgcm.encrypt(aesgcm_nonce, serialized_context, None)
 
         encrypted_context = argon_salt + aesgcm_nonce + encrypted_context
-        response = requests.post(
-            url=f'{BASE_API_URL}/user/profile/save-context-key',
-            headers=request.headers,
+        response = request_upstream(
+            'POST',
+            '/user/profile/save-context-key',
+            headers=forward_headers(request.headers),
             json={
                 'context': base64.b64encode(encrypted_context).decode(),
+                'context_profile': context_profile,
             }
         )
 
+        # Context lama session ini tidak berlaku lagi
+        opened_context_cache.forget_session(session_key(request))
+
         resp_data = response.json()
         resp_data['data'] = mnemonic_phrase
         return jsonify(resp_data), response.status_code
@@ -124,24 +126,33 @@ def generate_context_key():
 @user_profile_controller.route('check-saved-context-key', methods=['GET'])
 def check_saved_context_key():
     try:
-        response = requests.get(
-            f'{BASE_API_URL}/user/profile/check-saved-context-key',
-            headers=request.headers
-        )
-
-        excluded_headers = ['content-encoding', 'transfer-encoding', 'content-length', 'connection']
-        headers_to_send = [(name, value) for (name, value) in response.raw.headers.items()
-                        if name.lower() not in excluded_headers]
-        return Response(response.content, response.status_code, headers_to_send)
+        return proxy('/user/profile/check-saved-context-key')
     except Exception as e:
         return jsonify({'error': True, 'message': str(e)}), 500
     
 @user_profile_controller.route('open-saved-context-key', methods=['POST'])
 def open_saved_context_key():
     try:
-        response = requests.get(
-            f'{BASE_API_URL}/user/profile/get-saved-context-key',
-            headers=request.headers
+        input = request.get_json()
+        mnemonic_phrase = input['mnemonic_phrase']
+        key = session_key(request)
+
+        # Dibuka ulang dalam session yang sama: tanpa fetch backend & KDF
+        cached = opened_context_cache.session_context(key, mnemonic_phrase)
+        if cached is not None:
+            (decrypted_context, context_profile) = cached
+            if not context_store.exists(key):
+                context_store.save(key, decrypted_context, context_profile)
+            return jsonify({
+                'error': False,
+                'message' : 'Successfully opened context',
+                'data': None,
+            })
+
+        response = request_upstream(
+            'GET',
+            '/user/profile/get-saved-context-key',
+            headers=forward_headers(request.headers)
         )
 
         response_json = response.json()
@@ -150,30 +161,24 @@ def open_saved_context_key():
         if response_json['error']:
             return jsonify(response_json), response.status_code
 
-        input = request.get_json()
-        mnemonic_phrase = input['mnemonic_phrase']
-        mnemo = mnemonic.Mnemonic('english')
-        mnemonic_phrase_seed = mnemo.to_seed(mnemonic_phrase)
         context = base64.b64decode(resp_data['context'])
-        argon_salt = context[:ARGON_SALT_LEN]
-        nonce_offset = ARGON_SALT_LEN + AESGCM_NONCE_LEN
-        aesgcm_nonce = context[ARGON_SALT_LEN:nonce_offset]
-        encrypted_context = context[nonce_offset:]
-        kdf = Argon2id(
-            salt=argon_salt,
-            length=32,
-            iterations=1,
-            lanes=4,
-            memory_cost=64 * 1024,
-            ad=None,
-            secret=None,
-        )
-        key = kdf.derive(mnemonic_phrase_seed)
-        aesgcm = AESGCM(key)
-        decrypted_context = aesgcm.decrypt(aesgcm_nonce, encrypted_context, None)
-        os.makedirs(os.path.dirname(TEMP_FILE_PATH), exist_ok=True)
-        with open(f'{TEMP_FILE_PATH}/{CONTEXT_KEY_FILE_NAME}', 'wb') as f:
-            f.write(decrypted_context)
+        # Hanya petunjuk (context lama tidak punya context_profile),
+        # profil sebenarnya dibaca dari parameter context oleh context_store
+        context_profile = resp_data.get('context_profile') or LEGACY_CKKS_PROFILE
+
+        cache_key = opened_context_cache.entry_key(context, mnemonic_phrase)
+        decrypted_context = opened_context_cache.context(key, cache_key)
+        if decrypted_context is None:
+            argon_salt = context[:ARGON_SALT_LEN]
+            nonce_offset = ARGON_SALT_LEN + AESGCM_NONCE_LEN
+            aesgcm_nonce = context[ARGON_SALT_LEN:nonce_offset]
+            encrypted_context = context[nonce_offset:]
+            derived_key = opened_context_cache.derived_key(cache_key) or derive_context_key(mnemonic_phrase, argon_salt)
+            aesgcm = AESGCM(derived_key)
+            decrypted_context = aesgcm.decrypt(aesgcm_nonce, encrypted_context, None)
+            opened_context_cache.put(key, cache_key, derived_key, decrypted_context, context_profile)
+
+        context_store.save(key, decrypted_context, context_profile)
 
         return jsonify({
             'error': False,
@@ -187,7 +192,7 @@ def open_saved_context_key():
 @user_profile_controller.route('check-opened-saved-context-key', methods=['GET'])
 def check_opened_saved_context_key():
     try:
-        exists = os.path.isfile(f'{TEMP_FILE_PATH}/{CONTEXT_KEY_FILE_NAME}')
+        exists = context_store.exists(session_key(request))
         return jsonify({
             'error': False,
             'message' : '',
@@ -198,3 +203,11 @@ def check_opened_saved_context_key():
 
     except Exception as e:
         return jsonify({'error': True, 'message': str(e)}), 500
+
+@user_profile_controller.route('context-cache-stats', methods=['GET'])
+def context_cache_stats():
+    return jsonify({
+        'error': False,
+        'message' : '',
+        'data': dict(context_store.stats(), opened_contexts=opened_context_cache.stats()),
+    })
@@ -1,12 +1,254 @@
-from insightface.app import FaceAnalysis
+import os
+import threading
+import numpy as np
+import cv2
+import onnxruntime
+from insightface.app.common import Face
+from insightface.model_zoo.arcface_onnx import ArcFaceONNX
+from insightface.model_zoo.attribute import Attribute
+from insightface.model_zoo.landmark import Landmark
+from insightface.model_zoo.scrfd import SCRFD
+from insightface.utils import face_align, ensure_available
 
-# Initialize model with CPU optimization
-model = FaceAnalysis(
-    name='buffalo_l',
-    providers=['CPUExecutionProvider']
-)
-model.prepare(
-    ctx_id=-1,  # -1 for CPU
-    det_size=(320, 320),  # Smaller size for faster processing
-    det_thresh=0.5 
+from utils import (
+    FACE_MODULES,
+    FACE_MODEL_LOADING,
+    ORT_INTRA_OP_THREADS,
+    FACE_SELECTION,
+    BATCH_INFERENCE,
+    BATCH_MAX_SIZE,
+    BATCH_MAX_WAIT_MS,
+    BURST_SHARPNESS_REFERENCE,
 )
+from inference_scheduler import RecognitionBatcher
+from metrics import stage
+
+model = None
+recognition_batcher = None
+
+# Jumlah thread intra-op onnxruntime per proses (0 = default onnxruntime)
+intra_op_threads = ORT_INTRA_OP_THREADS
+
+# File ONNX buffalo_l per module FaceAnalysis
+BUFFALO_L_FILES = {
+    'detection': ('det_10g.onnx', SCRFD),
+    'recognition': ('w600k_r50.onnx', ArcFaceONNX),
+    'landmark_3d_68': ('1k3d68.onnx', Landmark),
+    'landmark_2d_106': ('2d106det.onnx', Landmark),
+    'genderage': ('genderage.onnx', Attribute),
+}
+
+_model_lock = threading.Lock()
+_ready = threading.Event()
+
+class FaceModels:
+    """Same prepare/get as insightface FaceAnalysis, over the modules of load_face_models.
+
+    FaceAnalysis itself creates a session for every ONNX file of the model
+    pack before filtering by allowed_modules.
+    """
+
+    def __init__(self, models: dict):
+        self.models = models
+        self.det_model = models['detection']
+
+    def prepare(self, ctx_id: int, det_thresh: float = 0.5, det_size: tuple = (640, 640)):
+        self.det_thresh = det_thresh
+        self.det_size = det_size
+        for taskname, task_model in self.models.items():
+            if taskname == 'detection':
+                task_model.prepare(ctx_id, input_size=det_size, det_thresh=det_thresh)
+            else:
+                task_model.prepare(ctx_id)
+
+    def get(self, img, max_num: int = 0) -> list:
+        bboxes, kpss = self.det_model.detect(img, max_num=max_num, metric='default')
+        faces = []
+        for i in range(bboxes.shape[0]):
+            face = Face(bbox=bboxes[i, 0:4], kps=kpss[i] if kpss is not None else None, det_score=bboxes[i, 4])
+            for taskname, task_model in self.models.items():
+                if taskname != 'detection':
+                    task_model.get(img, face)
+            faces.append(face)
+        return faces
+
+def session_options() -> onnxruntime.SessionOptions:
+    sess_options = onnxruntime.SessionOptions()
+    if intra_op_threads > 0:
+        sess_options.intra_op_num_threads = intra_op_threads
+        sess_options.inter_op_num_threads = 1
+    return sess_options
+
+def load_face_models(modules: list, name: str = 'buffalo_l') -> FaceModels:
+    """Create an onnxruntime session only for the model files of `modules`."""
+    onnxruntime.set_default_logger_severity(3)
+    model_dir = ensure_available('models', name, root='~/.insightface')
+    models = {}
+    for taskname in modules:
+        if taskname not in BUFFALO_L_FILES:
+            raise ValueError(f'Unknown face module {taskname!r} (FACE_MODULES)')
+        (filename, model_class) = BUFFALO_L_FILES[taskname]
+        model_file = os.path.join(model_dir, filename)
+        session = onnxruntime.InferenceSession(
+            model_file,
+            sess_options=session_options(),
+            providers=['CPUExecutionProvider'],
+        )
+        models[taskname] = model_class(model_file, session=session)
+    return FaceModels(models)
+
+def single_threaded(face_model: FaceModels) -> bool:
+    """True when no session of `face_model` has an onnxruntime thread pool."""
+    for task_model in face_model.models.values():
+        options = task_model.session.get_session_options()
+        if options.intra_op_num_threads != 1 or options.inter_op_num_threads != 1:
+            return False
+    return True
+
+def get_model() -> FaceModels:
+    """Load the buffalo_l models on first use (only FACE_MODULES)."""
+    global model, recognition_batcher
+    if model is None:
+        with _model_lock:
+            if model is None:
+                # Initialize model with CPU optimization
+                face_model = load_face_models(FACE_MODULES)
+                face_model.prepare(
+                    ctx_id=-1,  # -1 for CPU
+                    det_size=(320, 320),  # Smaller size for faster processing
+                    det_thresh=0.5 
+                )
+
+                if BATCH_INFERENCE:
+                    recognition_batcher = RecognitionBatcher(
+                        face_model.models['recognition'],
+                        max_batch_size=BATCH_MAX_SIZE,
+                        max_wait=BATCH_MAX_WAIT_MS / 1000,
+                    )
+                model = face_model
+    return model
+
+def warmup():
+    """Load the models and run one inference through each of them."""
+    face_model = get_model()
+    for taskname, task_model in face_model.models.items():
+        if taskname == 'detection':
+            task_model.detect(np.zeros((320, 320, 3), dtype=np.uint8), max_num=0, metric='default')
+        elif taskname == 'recognition':
+            size = task_model.input_size[0]
+            task_model.get_feat(np.zeros((size, size, 3), dtype=np.uint8))
+    _ready.set()
+
+def start_warmup():
+    threading.Thread(target=warmup, name='face-model-warmup', daemon=True).start()
+
+def is_ready() -> bool:
+    # Mode lazy: model dimuat saat request pertama, jadi selalu siap menerima request
+    return _ready.is_set() or FACE_MODEL_LOADING == 'lazy'
+
+def get_faces_batched(img) -> list:
+    """Same result as model.get, but recognition goes through the batcher."""
+    face_model = get_model()
+    bboxes, kpss = face_model.det_model.detect(img, max_num=0, metric='default')
+    if bboxes.shape[0] == 0:
+        return []
+
+    rec_model = face_model.models['recognition']
+    faces = []
+    futures = []
+    for i in range(bboxes.shape[0]):
+        face = Face(bbox=bboxes[i, 0:4], kps=kpss[i] if kpss is not None else None, det_score=bboxes[i, 4])
+        for taskname, task_model in face_model.models.items():
+            if taskname in ('detection', 'recognition'):
+                continue
+            task_model.get(img, face)
+
+        aligned_img = face_align.norm_crop(img, landmark=face.kps, image_size=rec_model.input_size[0])
+        futures.append(recognition_batcher.submit(aligned_img))
+        faces.append(face)
+
+    for face, future in zip(faces, futures):
+        face.embedding = future.result()
+    return faces
+
+def get_faces(img) -> list:
+    face_model = get_model()
+    if recognition_batcher is not None:
+        return get_faces_batched(img)
+    return face_model.get(img)
+
+def face_priority(bbox, det_score: float, img_shape) -> float:
+    """Rank a detection by size, centrality and detection score."""
+    img_h, img_w = img_shape[:2]
+    x1, y1, x2, y2 = bbox
+    area = max(0.0, x2 - x1) * max(0.0, y2 - y1) / float(img_w * img_h)
+
+    # 0 di tengah gambar, 1 di pojok
+    dx = ((x1 + x2) / 2 - img_w / 2) / (img_w / 2)
+    dy = ((y1 + y2) / 2 - img_h / 2) / (img_h / 2)
+    offset = min(1.0, (dx * dx + dy * dy) ** 0.5 / 2 ** 0.5)
+
+    # bbox SCRFD float32: hasil np.float32 tidak bisa di-jsonify
+    return float(det_score * area ** 0.5 * (1.0 - 0.5 * offset))
+
+def face_sharpness(img, bbox) -> float:
+    """Variance of the Laplacian over the face crop, higher is sharper."""
+    img_h, img_w = img.shape[:2]
+    x1, y1, x2, y2 = (int(round(float(value))) for value in bbox)
+    crop = img[max(0, y1):min(img_h, y2), max(0, x1):min(img_w, x2)]
+    if crop.size == 0:
+        return 0.0
+    return float(cv2.Laplacian(cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY), cv2.CV_64F).var())
+
+def frame_score(bbox, det_score: float, sharpness: float, img_shape) -> float:
+    """Rank the frames of a burst: face_priority weighted by face sharpness."""
+    return float(face_priority(bbox, det_score, img_shape) * sharpness / (sharpness + BURST_SHARPNESS_REFERENCE))
+
+def detect_primary_face(img, timer=None):
+    """Best face of the image by face_priority, detection only (no embedding)."""
+    face_model = get_model()
+    with stage(timer, 'detection'):
+        bboxes, kpss = face_model.det_model.detect(img, max_num=0, metric='default')
+    if bboxes.shape[0] == 0:
+        return None
+
+    best = max(range(bboxes.shape[0]), key=lambda i: face_priority(bboxes[i, 0:4], bboxes[i, 4], img.shape))
+    return Face(bbox=bboxes[best, 0:4], kps=kpss[best] if kpss is not None else None, det_score=bboxes[best, 4])
+
+def embed_face(img, face, timer=None):
+    """Run the remaining modules and recognition on a detected face."""
+    face_model = get_model()
+    for taskname, task_model in face_model.models.items():
+        if taskname in ('detection', 'recognition'):
+            continue
+        task_model.get(img, face)
+
+    rec_model = face_model.models['recognition']
+    with stage(timer, 'recognition'):
+        if recognition_batcher is not None:
+            aligned_img = face_align.norm_crop(img, landmark=face.kps, image_size=rec_model.input_size[0])
+            face.embedding = recognition_batcher.submit(aligned_img).result()
+        else:
+            rec_model.get(img, face)
+    return face
+
+def get_primary_face(img, min_det_score: float = 0.0, timer=None):
+    """Detect every face but only align + embed the best one.
+
+    Returns None when no face is found. When the best face scores below
+    `min_det_score` it is returned without an embedding.
+    """
+    face = detect_primary_face(img, timer)
+    if face is None or face.det_score < min_det_score:
+        return face
+    return embed_face(img, face, timer)
+
+def get_main_face(img, min_det_score: float = 0.0, timer=None):
+    """The face the controllers work with, according to FACE_SELECTION."""
+    if FACE_SELECTION == 'primary':
+        return get_primary_face(img, min_det_score, timer)
+
+    # model.get: deteksi & recognition tidak bisa diukur terpisah
+    with stage(timer, 'inference'):
+        faces = get_faces(img)
+    return faces[0] if faces else None
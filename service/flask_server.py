@@ -1,20 +1,20 @@
 import os
-from flask import Flask, send_from_directory, request, Response
+from flask import Flask, request, Response, abort, g
 from flask_cors import CORS
 
 from controller import base_controller
+import face_analysis
+from static_assets import AssetManifest
 
-from utils import UPLOAD_FOLDER, MAX_CONTENT_LENGTH
+from utils import UPLOAD_FOLDER, MAX_CONTENT_LENGTH, FACE_MODEL_LOADING, CORS_ORIGINS, SERVER_TIMING
 
 app = Flask(__name__, static_folder='build')
 CORS(
     app,
-    origins=[
-        'http://localhost:5001',
-        'http://localhost:5173'
-    ],
+    origins=CORS_ORIGINS,
     methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
-    allow_headers=['Content-Type', 'Authorization']
+    allow_headers=['Content-Type', 'Authorization'],
+    expose_headers=['Server-Timing'],
 )
 
 app.register_blueprint(base_controller)
@@ -22,23 +22,47 @@ app.register_blueprint(base_controller)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
+# Muat model + warmup di background, /api/status/ready menjadi 200 setelah selesai
+if FACE_MODEL_LOADING == 'background':
+    face_analysis.start_warmup()
+
+# Isi build/ dimuat sekali ke memori (beserta varian gzip/brotli)
+asset_manifest = AssetManifest(app.static_folder)
+
 @app.before_request
 def before_request():
     if request.method == 'OPTIONS':
         return Response()
 
+@app.after_request
+def after_request(response):
+    timer = g.get('stage_timer')
+    if SERVER_TIMING and timer is not None:
+        response.headers['Server-Timing'] = timer.server_timing()
+    return response
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
-    full_path = os.path.join(app.static_folder, path)
+    static_file = asset_manifest.lookup('/' + path)
+    if static_file is None:
+        abort(404)
 
-    if os.path.isfile(full_path):
-        return send_from_directory(app.static_folder, path)
+    encoding, body, etag = static_file.response_body(request.headers.get('Accept-Encoding'))
+    headers = {
+        'ETag': etag,
+        'Last-Modified': static_file.last_modified,
+        'Cache-Control': static_file.cache_control,
+    }
+    if static_file.variants:
+        headers['Vary'] = 'Accept-Encoding'
 
-    if os.path.isdir(full_path) and os.path.isfile(os.path.join(full_path, 'index.html')):
-        return send_from_directory(full_path, 'index.html')
+    if static_file.not_modified(etag, request.headers.get('If-None-Match'), request.headers.get('If-Modified-Since')):
+        return Response(status=304, headers=headers)
 
-    return send_from_directory(app.static_folder, 'index.html')
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(body, headers=headers, content_type=static_file.content_type)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5001))
@@ -1,67 +1,161 @@
-import os
 import sys
 import signal
+import socket
 import json
-from http.server import SimpleHTTPRequestHandler, HTTPServer
-from time import sleep
+import shutil
+import threading
+from urllib.parse import urlsplit, unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from static_assets import StaticIndex
+
+class SPAHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Koneksi keep-alive yang idle ditutup setelah 15 detik (atau langsung saat shutdown)
+    timeout = 15
+
+    def setup(self):
+        super().setup()
+        self.server.set_idle(self.connection, False)
+
+    def finish(self):
+        self.server.forget(self.connection)
+        super().finish()
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        # Server berhenti: jangan menunggu request berikutnya di koneksi ini
+        if not self.close_connection and not self.server.set_idle(self.connection, True):
+            self.close_connection = True
+
+    def parse_request(self) -> bool:
+        self.server.set_idle(self.connection, False)
+        return super().parse_request()
 
-class SPAHandler(SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, directory="build", **kwargs)
-    
     def do_GET(self):
         # Handle API requests
         if self.path.startswith('/api/v1/'):
             return self.handle_api_request()
-            
-        # Fallback to SPA handling
-        path = self.translate_path(self.path)
-        if not os.path.exists(path) or os.path.isdir(path):
-            self.path = "/index.html"
-        return super().do_GET()
-    
+
+        self.send_static(head_only=False)
+
+    def do_HEAD(self):
+        self.send_static(head_only=True)
+
+    def send_static(self, head_only: bool):
+        url_path = unquote(urlsplit(self.path).path)
+        static_file = self.server.static_index.lookup(url_path)
+        if static_file is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        encoding, filepath, size, etag = static_file.variant(self.headers.get('Accept-Encoding'))
+        not_modified = static_file.not_modified(
+            etag,
+            self.headers.get('If-None-Match'),
+            self.headers.get('If-Modified-Since'),
+        )
+
+        self.send_response(304 if not_modified else 200)
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', static_file.last_modified)
+        self.send_header('Cache-Control', static_file.cache_control)
+        if static_file.variants:
+            self.send_header('Vary', 'Accept-Encoding')
+        if not_modified:
+            self.end_headers()
+            return
+
+        self.send_header('Content-Type', static_file.content_type)
+        self.send_header('Content-Length', str(size))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+
+        if not head_only:
+            with open(filepath, 'rb') as f:
+                shutil.copyfileobj(f, self.wfile)
+
     def handle_api_request(self):
         # Contoh implementasi API endpoint
         if self.path == '/api/v1/data':
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
             response = json.dumps({
                 'status': 'success',
                 'data': {'message': 'Hello from API!'}
-            })
-            self.wfile.write(response.encode())
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(response)))
+            self.end_headers()
+            self.wfile.write(response)
         else:
             self.send_response(404)
+            self.send_header('Content-Length', '0')
             self.end_headers()
 
-class GracefulServer(HTTPServer):
-    def __init__(self, *args, **kwargs):
+class GracefulServer(ThreadingHTTPServer):
+    # Thread non-daemon: server_close() menunggu semua request selesai
+    daemon_threads = False
+    block_on_close = True
+
+    def __init__(self, *args, directory='build', **kwargs):
         super().__init__(*args, **kwargs)
-        self.stop = False
-    
-    def serve_forever(self):
-        while not self.stop:
-            self.handle_request()
+        self.static_index = StaticIndex(directory)
+        self.stopping = False
+        self._connections_lock = threading.Lock()
+        # socket -> True jika idle (menunggu request berikutnya)
+        self._connections = {}
+
+    def set_idle(self, connection, idle: bool) -> bool:
+        """Record the state of a connection; False once the server is stopping."""
+        with self._connections_lock:
+            if self.stopping:
+                return False
+            self._connections[connection] = idle
+            return True
+
+    def forget(self, connection):
+        with self._connections_lock:
+            self._connections.pop(connection, None)
+
+    def stop(self):
+        """Stop accepting and close idle keep-alive connections.
+
+        Connections in the middle of a request are closed after their
+        response; server_close() waits for them.
+        """
+        self.shutdown()
+        with self._connections_lock:
+            self.stopping = True
+            idle = [connection for (connection, is_idle) in self._connections.items() if is_idle]
+        for connection in idle:
+            try:
+                # Membangunkan thread yang sedang menunggu di readline
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
 
 def run_server(port=8000):
     server = GracefulServer(('', port), SPAHandler)
-    
+
     # Handle graceful shutdown
     def signal_handler(sig, frame):
         print("\nMenerima sinyal shutdown, menutup server...")
-        server.stop = True
-        server.server_close()
-        sleep(1)  # Beri waktu untuk menyelesaikan request yang sedang diproses
-        sys.exit(0)
-    
+        # stop() (shutdown) harus dipanggil dari thread lain selain serve_forever
+        threading.Thread(target=server.stop, daemon=True).start()
+
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
-    
+
     print(f"Server berjalan di port {port} (http://localhost:{port})")
     print("Tekan Ctrl+C untuk berhenti")
     server.serve_forever()
+    # Tunggu request yang sedang diproses selesai
+    server.server_close()
+    sys.exit(0)
 
 if __name__ == '__main__':
     port = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
-    run_server(port)
\ No newline at end of file
+    run_server(port)
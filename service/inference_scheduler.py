@@ -0,0 +1,88 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+class RecognitionBatcher:
+    """Micro-batching scheduler for the ArcFace recognition session.
+
+    Aligned face crops submitted by concurrent requests are collected into
+    one batch (up to `max_batch_size` crops, waiting at most `max_wait`
+    seconds after the first one) and run through a single session call.
+    """
+
+    def __init__(self, rec_model, max_batch_size: int, max_wait: float):
+        self.rec_model = rec_model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        # Model dengan batch dimension tetap tidak bisa di-batch lebih besar
+        batch_dim = rec_model.session.get_inputs()[0].shape[0]
+        if isinstance(batch_dim, int) and batch_dim > 0:
+            self.max_batch_size = min(self.max_batch_size, batch_dim)
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._batch_sizes = {}
+        self._batches = 0
+        self._items = 0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='recognition-batcher', daemon=True)
+                self._thread.start()
+
+    def submit(self, aligned_img) -> Future:
+        self._ensure_started()
+        future = Future()
+        self._queue.put((aligned_img, future))
+        return future
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            batch = [(img, future) for (img, future) in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            with self._lock:
+                size = len(batch)
+                self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+                self._batches += 1
+                self._items += size
+
+            try:
+                features = self.rec_model.get_feat([img for (img, _) in batch])
+            except Exception as e:
+                for (_, future) in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), feature in zip(batch, features):
+                future.set_result(feature.flatten())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'batches': self._batches,
+                'items': self._items,
+                'batch_size_histogram': dict(sorted(self._batch_sizes.items())),
+            }
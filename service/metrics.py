@@ -0,0 +1,124 @@
+import re
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+
+# Detik, sama dengan default client Prometheus
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for (name, value) in labels) + '}'
+
+class Histogram:
+    """Prometheus histogram, one series per label combination."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # labels -> [bucket counts..., sum, count]
+        self._series = {}
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} histogram',
+        ]
+        with self._lock:
+            series = {key: list(values) for (key, values) in self._series.items()}
+        for key, values in sorted(series.items()):
+            labels = tuple(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{_format_labels(labels + (("le", repr(bound)),))} {count}')
+            lines.append(f'{self.name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {values[-1]}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {values[-2]}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {values[-1]}')
+        return lines
+
+def render_metrics(extra_lines: list | None = None) -> str:
+    """Prometheus text exposition of every registered metric."""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return '\n'.join(lines + (extra_lines or [])) + '\n'
+
+stage_seconds = Histogram(
+    'face_pipeline_stage_seconds',
+    'Duration of each face pipeline stage.',
+    ('pipeline', 'stage'),
+)
+upstream_seconds = Histogram(
+    'upstream_request_seconds',
+    'Backend API round-trip until the response headers are received.',
+    ('method', 'route', 'status'),
+)
+
+# Segmen path yang mengandung angka (id) digabung jadi satu route
+_ID_SEGMENT = re.compile(r'/[^/]*\d[^/]*(?=/|$)')
+
+def upstream_route(path: str) -> str:
+    return _ID_SEGMENT.sub('/{id}', path.split('?', 1)[0])
+
+def observe_upstream(method: str, path: str, status, seconds: float):
+    upstream_seconds.observe(seconds, method=method.upper(), route=upstream_route(path), status=str(status))
+
+class StageTimer:
+    """Times the stages of one request.
+
+    Every stage is recorded in `face_pipeline_stage_seconds` and summed per
+    stage for the Server-Timing header (stages of parallel images add up).
+    Can be shared between worker threads.
+    """
+
+    def __init__(self, pipeline: str):
+        self.pipeline = pipeline
+        self.durations = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        stage_seconds.observe(seconds, pipeline=self.pipeline, stage=name)
+        with self._lock:
+            self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def milliseconds(self) -> dict:
+        with self._lock:
+            return {name: round(seconds * 1000, 3) for (name, seconds) in self.durations.items()}
+
+    def server_timing(self) -> str:
+        return ', '.join(f'{name};dur={duration}' for (name, duration) in self.milliseconds().items())
+
+def stage(timer: StageTimer | None, name: str):
+    """timer.stage(name), or a no-op when there is no timer."""
+    if timer is None:
+        return nullcontext()
+    return timer.stage(name)
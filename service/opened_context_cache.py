@@ -0,0 +1,189 @@
+import hmac
+import time
+import ctypes
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+
+from utils import (
+    OPENED_CONTEXT_CACHE_MAX_BYTES,
+    OPENED_CONTEXT_CACHE_MAX_ENTRIES,
+    OPENED_CONTEXT_CACHE_TTL,
+)
+
+def zero(buffer: bytearray | None):
+    """Overwrite a mutable buffer in place (only this buffer, not copies of it)."""
+    if buffer:
+        ctypes.memset((ctypes.c_char * len(buffer)).from_buffer(buffer), 0, len(buffer))
+
+class OpenedContext:
+    def __init__(self, derived_key: bytes, decrypted_context: bytes, profile: str, last_access: float):
+        self.derived_key = bytearray(derived_key)
+        self.decrypted_context = bytearray(decrypted_context)
+        self.profile = profile
+        self.last_access = last_access
+
+    @property
+    def size(self) -> int:
+        return len(self.decrypted_context) if self.decrypted_context is not None else 0
+
+    def drop_context(self):
+        zero(self.decrypted_context)
+        self.decrypted_context = None
+
+    def wipe(self):
+        self.drop_context()
+        zero(self.derived_key)
+
+class OpenedContextCache:
+    """Derived Argon2id keys and decrypted contexts of recently opened context keys.
+
+    Entries are keyed by the hash of the encrypted context and a keyed digest
+    of the mnemonic phrase, so only the same phrase unlocks an entry. Over
+    the byte budget the least recently used decrypted contexts are dropped
+    first (their derived key is kept, a reopen then only runs AES-GCM).
+    Entries idle longer than the TTL are removed. The cache's own buffers
+    are zeroed when dropped; the bytes copies handed to callers, and the
+    TenSEAL contexts deserialized from them (kept by context_store), are
+    not, so this limits how long the cache holds key material but does not
+    erase it from the process. Each session remembers the entry it opened,
+    so reopening within the session needs no backend fetch either.
+    """
+
+    def __init__(self, max_bytes: int, max_entries: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = max_entries > 0 and ttl > 0
+        # Digest mnemonic hanya berlaku di proses ini
+        self._pepper = secrets.token_bytes(32)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # session key -> entry key
+        self._sessions = {}
+        self._bytes = 0
+        self._hits = {
+            'session': 0,
+            'context': 0,
+            'key': 0,
+        }
+        self._misses = 0
+
+    def _phrase_digest(self, mnemonic_phrase: str) -> str:
+        return hmac.new(self._pepper, mnemonic_phrase.encode(), hashlib.sha256).hexdigest()
+
+    def entry_key(self, encrypted_context: bytes, mnemonic_phrase: str) -> tuple:
+        return (hashlib.sha256(encrypted_context).hexdigest(), self._phrase_digest(mnemonic_phrase))
+
+    def _remove(self, entry_key: tuple):
+        entry = self._entries.pop(entry_key)
+        self._bytes -= entry.size
+        entry.wipe()
+        for session, key in list(self._sessions.items()):
+            if key == entry_key:
+                del self._sessions[session]
+
+    def _expire(self, now: float):
+        for entry_key, entry in list(self._entries.items()):
+            if now - entry.last_access <= self.ttl:
+                # OrderedDict urut berdasarkan akses terakhir
+                break
+            self._remove(entry_key)
+
+    def _enforce_budget(self, keep: tuple):
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+        for entry_key, entry in self._entries.items():
+            if self._bytes <= self.max_bytes:
+                break
+            if entry_key != keep and entry.decrypted_context is not None:
+                self._bytes -= entry.size
+                entry.drop_context()
+        # Context yang baru dibuka pun tidak muat
+        entry = self._entries.get(keep)
+        if entry is not None and self._bytes > self.max_bytes:
+            self._bytes -= entry.size
+            entry.drop_context()
+
+    def _touch(self, entry_key: tuple) -> OpenedContext | None:
+        now = time.time()
+        self._expire(now)
+        entry = self._entries.get(entry_key)
+        if entry is not None:
+            entry.last_access = now
+            self._entries.move_to_end(entry_key)
+        return entry
+
+    def session_context(self, session: str | None, mnemonic_phrase: str) -> tuple | None:
+        """(decrypted context, profile) opened earlier in this session with the same phrase."""
+        if not self.enabled or session is None:
+            return None
+        with self._lock:
+            entry_key = self._sessions.get(session)
+            if entry_key is None or not hmac.compare_digest(entry_key[1], self._phrase_digest(mnemonic_phrase)):
+                return None
+            entry = self._touch(entry_key)
+            if entry is None or entry.decrypted_context is None:
+                return None
+            self._hits['session'] += 1
+            return bytes(entry.decrypted_context), entry.profile
+
+    def context(self, session: str | None, entry_key: tuple) -> bytes | None:
+        """Decrypted context of the entry, and binds it to the session."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._touch(entry_key)
+            if entry is None or entry.decrypted_context is None:
+                return None
+            self._hits['context'] += 1
+            if session is not None:
+                self._sessions[session] = entry_key
+            return bytes(entry.decrypted_context)
+
+    def derived_key(self, entry_key: tuple) -> bytes | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._touch(entry_key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits['key'] += 1
+            return bytes(entry.derived_key)
+
+    def put(self, session: str | None, entry_key: tuple, derived_key: bytes, decrypted_context: bytes, profile: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            if entry_key in self._entries:
+                self._remove(entry_key)
+            entry = self._entries[entry_key] = OpenedContext(derived_key, decrypted_context, profile, now)
+            self._bytes += entry.size
+            if session is not None:
+                self._sessions[session] = entry_key
+            self._enforce_budget(keep=entry_key)
+
+    def forget_session(self, session: str | None):
+        with self._lock:
+            self._sessions.pop(session, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'sessions': len(self._sessions),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': dict(self._hits),
+                'misses': self._misses,
+            }
+
+opened_context_cache = OpenedContextCache(
+    OPENED_CONTEXT_CACHE_MAX_BYTES,
+    OPENED_CONTEXT_CACHE_MAX_ENTRIES,
+    OPENED_CONTEXT_CACHE_TTL,
+)
@@ -0,0 +1,175 @@
+import os
+import sys
+import time
+import signal
+import socket
+import threading
+import traceback
+
+# Model dimuat oleh master (atau worker), bukan oleh flask_server saat import
+os.environ['FACE_MODEL_LOADING'] = 'manual'
+
+from werkzeug.serving import make_server
+
+import face_analysis
+from flask_server import app
+
+from utils import (
+    PREFORK_WORKERS,
+    PREFORK_GRACEFUL_TIMEOUT,
+)
+
+class Worker:
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.stopping = False
+
+class PreforkServer:
+    """Pre-fork WSGI server.
+
+    The master binds the listening socket, loads and warms up the face
+    models once, then forks `workers` processes that share the socket and,
+    through copy-on-write, the loaded ONNX weights. This needs one
+    onnxruntime thread per worker; with more, every worker loads its own
+    models after the fork.
+
+    SIGTERM/SIGINT: graceful shutdown (workers finish in-flight requests).
+    SIGHUP: graceful reload (new workers are started before old ones stop).
+    """
+
+    def __init__(self, host: str, port: int, workers: int):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+        self.children = {}
+        self.running = True
+        self.reload_requested = False
+        self.socket = None
+
+    def bind(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(socket.SOMAXCONN)
+        self.socket.set_inheritable(True)
+
+    def preload(self):
+        face_analysis.intra_op_threads = self.threads_per_worker
+        if self.threads_per_worker > 1:
+            # Thread pool onnxruntime tidak ikut ter-fork, model dimuat per worker
+            print(f'{self.threads_per_worker} threads per worker, models are loaded in every worker')
+            return
+
+        # Session dengan 1 thread intra-op & inter-op tidak membuat thread pool,
+        # jadi aman dibagikan ke worker lewat fork
+        if not face_analysis.single_threaded(face_analysis.get_model()):
+            raise RuntimeError('onnxruntime sessions are not single-threaded, they cannot be shared through fork')
+        face_analysis.warmup()
+
+    def spawn_worker(self):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                self.run_worker()
+            except Exception:
+                traceback.print_exc()
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        self.children[pid] = Worker(pid)
+
+    def run_worker(self):
+        for sig in (signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_IGN)
+
+        if not face_analysis.is_ready():
+            face_analysis.warmup()
+
+        server = make_server(self.host, self.port, app, threaded=True, fd=self.socket.fileno())
+        # Tunggu request yang sedang berjalan saat server ditutup
+        server.daemon_threads = False
+        server.block_on_close = True
+
+        def stop(sig, frame):
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        server.serve_forever()
+        server.server_close()
+
+    def stop_workers(self, pids: list):
+        for pid in pids:
+            self.children[pid].stopping = True
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + PREFORK_GRACEFUL_TIMEOUT
+        while time.monotonic() < deadline and any(pid in self.children for pid in pids):
+            self.reap()
+            time.sleep(0.1)
+
+        for pid in pids:
+            if pid in self.children:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        while any(pid in self.children for pid in pids):
+            self.reap()
+            time.sleep(0.1)
+
+    def reap(self):
+        while self.children:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            worker = self.children.pop(pid, None)
+            if worker is not None and not worker.stopping and self.running:
+                print(f'Worker {pid} exited unexpectedly, starting a new one')
+                self.spawn_worker()
+
+    def reload(self):
+        old_pids = list(self.children)
+        for _ in range(self.workers):
+            self.spawn_worker()
+        self.stop_workers(old_pids)
+
+    def run(self):
+        self.bind()
+        self.preload()
+        for _ in range(self.workers):
+            self.spawn_worker()
+
+        def handle_stop(sig, frame):
+            self.running = False
+
+        def handle_reload(sig, frame):
+            self.reload_requested = True
+
+        signal.signal(signal.SIGTERM, handle_stop)
+        signal.signal(signal.SIGINT, handle_stop)
+        signal.signal(signal.SIGHUP, handle_reload)
+
+        print(f'Server running on http://{self.host}:{self.port} with {self.workers} workers (pid {os.getpid()})')
+        while self.running:
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload()
+            self.reap()
+            time.sleep(0.5)
+
+        self.stop_workers(list(self.children))
+        self.socket.close()
+
+if __name__ == '__main__':
+    port = int(os.environ.get('PORT', 5001))
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else PREFORK_WORKERS
+    PreforkServer('0.0.0.0', port, workers).run()
@@ -0,0 +1,201 @@
+import os
+import re
+import gzip
+import hashlib
+import time
+import threading
+import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
+
+# Nama file hasil build Vite: assets/index-BX3kq9_a.js
+HASHED_ASSET_PATTERN = re.compile(r'-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'no-cache'
+
+COMPRESSIBLE_EXTENSIONS = {'.html', '.js', '.mjs', '.css', '.json', '.svg', '.txt', '.map', '.xml', '.webmanifest'}
+MIN_COMPRESS_SIZE = 1024
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content-Encoding -> ekstensi file precompressed, urut prioritas
+ENCODING_EXTENSIONS = {
+    'br': '.br',
+    'gzip': '.gz',
+}
+
+class StaticFile:
+    def __init__(self, url_path: str, filepath: str, stat: os.stat_result):
+        self.url_path = url_path
+        self.filepath = filepath
+        self.size = stat.st_size
+        self.mtime = int(stat.st_mtime)
+        self.etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        self.content_type = mimetypes.guess_type(filepath)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type in ('application/javascript', 'application/json'):
+            self.content_type += '; charset=utf-8'
+        self.cache_control = IMMUTABLE_CACHE_CONTROL \
+            if HASHED_ASSET_PATTERN.search(url_path) else DEFAULT_CACHE_CONTROL
+        # encoding -> (filepath, size)
+        self.variants = {}
+
+    def variant(self, accept_encoding: str | None):
+        """Return (encoding, filepath, size, etag) best matching Accept-Encoding."""
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in ENCODING_EXTENSIONS:
+            if encoding in self.variants and encoding in accepted:
+                filepath, size = self.variants[encoding]
+                return encoding, filepath, size, f'{self.etag[:-1]}-{encoding}"'
+        return None, self.filepath, self.size, self.etag
+
+    def not_modified(self, etag: str, if_none_match: str | None, if_modified_since: str | None) -> bool:
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or etag in tags or f'W/{etag}' in tags
+        if if_modified_since is not None:
+            try:
+                return self.mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+def parse_accept_encoding(header: str | None) -> set:
+    accepted = set()
+    for item in (header or '').split(','):
+        parts = item.strip().split(';')
+        encoding = parts[0].strip().lower()
+        if not encoding:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(encoding)
+    return accepted
+
+class StaticIndex:
+    """In-memory index of a build directory.
+
+    The tree is walked once; afterwards requests are resolved without any
+    filesystem lookups. The index is rebuilt when the directory is replaced
+    or index.html changes (checked at most every `check_interval` seconds).
+    """
+
+    def __init__(self, root: str, check_interval: float = 2.0):
+        self.root = os.path.abspath(root)
+        self.check_interval = check_interval
+        self.files = {}
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = 0.0
+        self.build()
+
+    def _root_signature(self):
+        signature = []
+        for path in (self.root, os.path.join(self.root, 'index.html')):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_ino, stat.st_mtime_ns))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _create_file(self, url_path: str, filepath: str, stat: os.stat_result) -> StaticFile:
+        return StaticFile(url_path, filepath, stat)
+
+    def build(self):
+        files = {}
+        signature = self._root_signature()
+        for dirpath, _, filenames in os.walk(self.root):
+            names = set(filenames)
+            for filename in filenames:
+                if any(filename.endswith(extension) and filename[:-len(extension)] in names
+                       for extension in ENCODING_EXTENSIONS.values()):
+                    # Varian precompressed, didaftarkan di file aslinya
+                    continue
+                filepath = os.path.join(dirpath, filename)
+                url_path = '/' + os.path.relpath(filepath, self.root).replace(os.sep, '/')
+                static_file = self._create_file(url_path, filepath, os.stat(filepath))
+                for encoding, extension in ENCODING_EXTENSIONS.items():
+                    if filename + extension in names:
+                        variant_path = filepath + extension
+                        static_file.variants[encoding] = (variant_path, os.path.getsize(variant_path))
+                files[url_path] = static_file
+
+                if filename == 'index.html':
+                    directory = url_path[:-len('index.html')]
+                    files[directory] = static_file
+                    if directory != '/':
+                        files[directory.rstrip('/')] = static_file
+
+        with self._lock:
+            self.files = files
+            self._signature = signature
+            self._checked_at = time.monotonic()
+
+    def refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        if self._root_signature() != self._signature:
+            self.build()
+
+    def lookup(self, url_path: str) -> StaticFile | None:
+        """Resolve a request path, falling back to index.html (SPA routes)."""
+        self.refresh()
+        files = self.files
+        return files.get(url_path) or files.get('/index.html')
+
+class InMemoryStaticFile(StaticFile):
+    def __init__(self, url_path: str, filepath: str, stat: os.stat_result):
+        super().__init__(url_path, filepath, stat)
+        with open(filepath, 'rb') as f:
+            self.body = f.read()
+        # ETag dari isi file, sama untuk semua worker dan deploy ulang
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+        # encoding -> body
+        self.variant_bodies = {}
+
+    def load_variants(self):
+        for encoding, (filepath, _) in self.variants.items():
+            with open(filepath, 'rb') as f:
+                self.variant_bodies[encoding] = f.read()
+
+        # Build lama tanpa file precompressed: kompres sekali di sini
+        extension = os.path.splitext(self.filepath)[1].lower()
+        if extension in COMPRESSIBLE_EXTENSIONS and self.size >= MIN_COMPRESS_SIZE:
+            if 'gzip' not in self.variant_bodies:
+                self.variant_bodies['gzip'] = gzip.compress(self.body, compresslevel=9, mtime=0)
+            if 'br' not in self.variant_bodies and brotli is not None:
+                self.variant_bodies['br'] = brotli.compress(self.body)
+
+        for encoding, body in self.variant_bodies.items():
+            self.variants[encoding] = (self.variants.get(encoding, (None,))[0], len(body))
+
+    def response_body(self, accept_encoding: str | None):
+        """Return (encoding, body, etag) best matching Accept-Encoding."""
+        encoding, _, _, etag = self.variant(accept_encoding)
+        if encoding is None:
+            return None, self.body, etag
+        return encoding, self.variant_bodies[encoding], etag
+
+class AssetManifest(StaticIndex):
+    """StaticIndex that keeps every file body (and its gzip/brotli variants) in memory."""
+
+    def _create_file(self, url_path: str, filepath: str, stat: os.stat_result) -> StaticFile:
+        return InMemoryStaticFile(url_path, filepath, stat)
+
+    def build(self):
+        super().build()
+        for static_file in set(self.files.values()):
+            static_file.load_variants()
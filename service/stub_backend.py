@@ -0,0 +1,290 @@
+"""Local stand-in for the backend API, for testing the service offline.
+
+Implements the endpoints the service calls: auth, the saved context key,
+register-faces (plain and packed), get-registered-faces,
+registered-face/<id> and verify (with real CKKS dot products, slot-wise
+products for packed faces and the public context fingerprint handshake).
+State is kept in memory per user.
+
+Usage (dari folder service/):
+    python stub_backend.py [port]
+"""
+import sys
+import json
+import base64
+import hashlib
+import secrets
+import itertools
+import threading
+from flask import Flask, Response, jsonify, request
+import tenseal as ts
+
+# Field biner yang di-base64 pada WIRE_FORMAT=json
+BINARY_FIELDS = {'real_img', 'rgb_img', 'encrypted_embedding', 'packed_query', 'ctx'}
+
+app = Flask(__name__)
+
+lock = threading.RLock()
+ids = itertools.count(1)
+# email -> user
+users = {}
+# access token -> email
+tokens = {}
+# user id -> {'context': b64, 'context_profile': ...}
+saved_contexts = {}
+# fingerprint -> public context
+contexts = {}
+# face id -> registered face (termasuk user_id)
+registered_faces = {}
+# packed id -> ciphertext berisi beberapa embedding (register-faces packed)
+packed_embeddings = {}
+stats = {
+    'context_uploads': 0,
+    'context_reused': 0,
+    'context_missing': 0,
+}
+
+def _decode_binary(value, key=None):
+    if isinstance(value, dict):
+        return {k: _decode_binary(v, k) for (k, v) in value.items()}
+    if isinstance(value, list):
+        return [_decode_binary(v, key) for v in value]
+    if key in BINARY_FIELDS and isinstance(value, str):
+        return base64.b64decode(value)
+    return value
+
+def _set_path(payload, path: str, value: bytes):
+    keys = path.split('.')
+    target = payload
+    for key in keys[:-1]:
+        target = target[int(key)] if isinstance(target, list) else target[key]
+    last = keys[-1]
+    if isinstance(target, list):
+        target[int(last)] = value
+    else:
+        target[last] = value
+
+def read_payload():
+    """Payload of a json or multipart (WIRE_FORMAT) request, binary fields as bytes."""
+    if request.mimetype == 'multipart/form-data':
+        payload = json.loads(request.form['metadata'])
+        for name, file in request.files.items():
+            _set_path(payload, name, file.read())
+        return payload
+    return _decode_binary(request.get_json())
+
+def error(message: str, status: int, data=None):
+    return jsonify({'error': True, 'message': message, 'data': data}), status
+
+def ok(message: str, data=None):
+    return jsonify({'error': False, 'message': message, 'data': data})
+
+def public_user(user: dict) -> dict:
+    return {key: value for (key, value) in user.items() if key != 'password'}
+
+def current_user() -> dict | None:
+    authorization = request.headers.get('Authorization', '')
+    token = authorization.removeprefix('Bearer ').strip()
+    with lock:
+        email = tokens.get(token)
+        return users.get(email)
+
+def user_faces(user_id: int) -> list:
+    with lock:
+        return [face for face in registered_faces.values() if face['user_id'] == user_id]
+
+@app.before_request
+def authenticate():
+    if request.path.startswith('/api/v1/user/') and current_user() is None:
+        return error('Unauthorized', 401)
+
+@app.route('/api/v1/auth/register', methods=['POST'])
+def register():
+    data = request.get_json()
+    if not data.get('email') or not data.get('password'):
+        return error('Email and password are required', 422)
+
+    with lock:
+        if data['email'] in users:
+            return error('Email already registered', 409)
+        user = users[data['email']] = {
+            'id': next(ids),
+            'email': data['email'],
+            'full_name': data.get('full_name'),
+            'phone_number': data.get('phone_number'),
+            'password': data['password'],
+        }
+    return ok('User registered', public_user(user))
+
+@app.route('/api/v1/auth/login', methods=['POST'])
+def login():
+    data = request.get_json()
+    with lock:
+        user = users.get(data.get('email'))
+        if user is None or user['password'] != data.get('password'):
+            return error('Invalid email or password', 401)
+        access_token = secrets.token_hex(16)
+        tokens[access_token] = user['email']
+    return ok('Logged in', {'access_token': access_token, 'user': public_user(user)})
+
+@app.route('/api/v1/auth/logout', methods=['POST'])
+def logout():
+    authorization = request.headers.get('Authorization', '')
+    with lock:
+        tokens.pop(authorization.removeprefix('Bearer ').strip(), None)
+    return ok('Logged out')
+
+@app.route('/api/v1/user/profile/update/<int:user_id>', methods=['POST', 'PUT'])
+def update_profile(user_id):
+    user = current_user()
+    if user['id'] != user_id:
+        return error('Forbidden', 403)
+
+    data = request.get_json()
+    with lock:
+        for key in ('full_name', 'phone_number'):
+            if key in data:
+                user[key] = data[key]
+    return ok('Profile updated', public_user(user))
+
+@app.route('/api/v1/user/profile/save-context-key', methods=['POST'])
+def save_context_key():
+    data = request.get_json()
+    with lock:
+        saved_contexts[current_user()['id']] = {
+            'context': data['context'],
+            'context_profile': data.get('context_profile'),
+        }
+    return ok('Context key saved')
+
+@app.route('/api/v1/user/profile/check-saved-context-key', methods=['GET'])
+def check_saved_context_key():
+    with lock:
+        exists = current_user()['id'] in saved_contexts
+    return ok('', {'exists': exists})
+
+@app.route('/api/v1/user/profile/get-saved-context-key', methods=['GET'])
+def get_saved_context_key():
+    with lock:
+        saved_context = saved_contexts.get(current_user()['id'])
+    if saved_context is None:
+        return error('Context key not found', 404)
+    return ok('', saved_context)
+
+@app.route('/api/v1/user/face-registration/register-faces', methods=['POST'])
+def register_faces():
+    payload = read_payload()
+    user_id = current_user()['id']
+    faces = payload['faces'] if isinstance(payload, dict) else payload
+
+    face_ids = []
+    with lock:
+        packed_ids = []
+        if isinstance(payload, dict):
+            for packed in payload['packed_embeddings']:
+                packed_id = next(ids)
+                packed_embeddings[packed_id] = dict(packed, user_id=user_id)
+                packed_ids.append(packed_id)
+        for face in faces:
+            face_id = next(ids)
+            registered_face = registered_faces[face_id] = dict(face, id=face_id, user_id=user_id)
+            if 'packed_embedding' in face:
+                registered_face['packed_embedding'] = dict(
+                    face['packed_embedding'],
+                    id=packed_ids[face['packed_embedding']['index']],
+                )
+            face_ids.append(face_id)
+    return ok('Faces registered', face_ids)
+
+@app.route('/api/v1/user/face-registration/get-registered-faces', methods=['GET'])
+def get_registered_faces():
+    return ok('', [face['id'] for face in user_faces(current_user()['id'])])
+
+@app.route('/api/v1/user/face-registration/registered-face/<int:face_id>', methods=['GET'])
+def get_registered_face(face_id):
+    with lock:
+        face = registered_faces.get(face_id)
+    if face is None or face['user_id'] != current_user()['id']:
+        return error('Picture not found', 404)
+    return Response(face['real_img'], content_type=face.get('mime_type') or 'application/octet-stream')
+
+@app.route('/api/v1/user/face-verification/verify', methods=['POST'])
+def verify():
+    payload = read_payload()
+    fingerprint = payload.get('ctx_fingerprint')
+
+    with lock:
+        if 'ctx' in payload and payload['ctx'] is not None:
+            serialized_context = payload['ctx']
+            fingerprint = fingerprint or hashlib.sha256(serialized_context).hexdigest()
+            if hashlib.sha256(serialized_context).hexdigest() != fingerprint:
+                return error('Context fingerprint mismatch', 400)
+            if fingerprint not in contexts:
+                contexts[fingerprint] = ts.context_from(serialized_context)
+            stats['context_uploads'] += 1
+        elif fingerprint in contexts:
+            stats['context_reused'] += 1
+        else:
+            stats['context_missing'] += 1
+            return error('Context not found', 409, {'reason': 'context_missing'})
+
+        context = contexts[fingerprint]
+
+    faces = user_faces(current_user()['id'])
+    if not faces:
+        return error('No registered faces', 404)
+    if any('packed_embedding' in face for face in faces) and payload.get('packed_query') is None:
+        return error('packed_query is required for faces registered packed', 409, {'reason': 'packed_query_missing'})
+
+    encrypted_embedding = ts.ckks_vector_from(context, payload['encrypted_embedding'])
+    # Satu item per wajah biasa, satu produk per ciphertext packed (urutan registrasi)
+    items = []
+    packed_items = {}
+    for face in faces:
+        if 'packed_embedding' not in face:
+            items.append(encrypted_embedding.dot(ts.ckks_vector_from(context, face['encrypted_embedding'])))
+            continue
+        packed_id = face['packed_embedding']['id']
+        if packed_id not in packed_items:
+            packed = packed_embeddings[packed_id]
+            packed_query = ts.ckks_vector_from(context, payload['packed_query'])
+            packed_items[packed_id] = {
+                'product': packed_query * ts.ckks_vector_from(context, packed['encrypted_embedding']),
+                'embedding_size': packed['embedding_size'],
+                'offsets': [],
+            }
+            items.append(packed_items[packed_id])
+        packed_items[packed_id]['offsets'].append(face['packed_embedding']['offset'])
+
+    if payload.get('result_mode') == 'packed' and not packed_items:
+        # Skor wajah ke-i di slot i, butuh satu level perkalian setelah dot
+        try:
+            packed = ts.CKKSVector.pack_vectors(items)
+        except ValueError as e:
+            return error(f'Cannot pack results with this context: {e}', 400)
+        return ok('Verified', {
+            'packed': base64.b64encode(packed.serialize()).decode(),
+            'count': len(items),
+        })
+    return ok('Verified', [
+        dict(item, product=base64.b64encode(item['product'].serialize()).decode()) if isinstance(item, dict)
+        else base64.b64encode(item.serialize()).decode()
+        for item in items
+    ])
+
+@app.route('/stub/stats', methods=['GET'])
+def get_stats():
+    with lock:
+        return jsonify(dict(stats, contexts=len(contexts), users=len(users), faces=len(registered_faces),
+                            packed_embeddings=len(packed_embeddings)))
+
+@app.route('/stub/forget-contexts', methods=['POST'])
+def forget_contexts():
+    # Simulasi backend kehilangan context (restart, eviction)
+    with lock:
+        contexts.clear()
+    return ok('Contexts cleared')
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    app.run(host='127.0.0.1', port=port, threaded=True)
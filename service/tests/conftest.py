@@ -0,0 +1,120 @@
+import os
+import sys
+import socket
+import secrets
+import threading
+import importlib
+from io import BytesIO
+
+import pytest
+
+SERVICE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVICE_PATH not in sys.path:
+    sys.path.insert(0, SERVICE_PATH)
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+STUB_PORT = _free_port()
+
+# Harus di-set sebelum utils di-import: service memakai stub_backend, model tidak dimuat
+os.environ['BASE_API_URL'] = f'http://127.0.0.1:{STUB_PORT}/api/v1'
+os.environ['FACE_MODEL_LOADING'] = 'lazy'
+
+PASSWORD = 'test-password'
+
+def controller_module(name: str):
+    """The controller module itself (controller.X is shadowed by its Blueprint)."""
+    return importlib.import_module(f'controller.{name}')
+
+def upload(files: list) -> list:
+    """(filename, bytes) pairs as test client file uploads."""
+    return [(BytesIO(content), name) for (name, content) in files]
+
+@pytest.fixture(scope='session')
+def stub_backend():
+    from werkzeug.serving import make_server
+    import stub_backend
+
+    server = make_server('127.0.0.1', STUB_PORT, stub_backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield stub_backend
+    server.shutdown()
+
+@pytest.fixture(scope='session')
+def app():
+    import flask_server
+    return flask_server.app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture(scope='session')
+def serialized_context() -> bytes:
+    """One v1 context with secret key for the whole run (keygen is slow)."""
+    from utils import create_ckks_context
+    return create_ckks_context('v1').serialize(save_secret_key=True)
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Empty context store in tmp_path, used by every controller."""
+    from context_store import ContextStore
+
+    context_store = ContextStore(str(tmp_path / 'sessions'), max_bytes=2 ** 40, ttl=3600)
+    for name in ('face_registration_controller', 'face_verification_controller', 'user_profile_controller'):
+        module = controller_module(name)
+        if hasattr(module, 'context_store'):
+            monkeypatch.setattr(module, 'context_store', context_store)
+    return context_store
+
+@pytest.fixture
+def user(stub_backend, client, store, serialized_context) -> dict:
+    """Logged-in stub user whose context is open in `store`; returns the request headers."""
+    from context_store import session_key_from_token
+
+    email = f'{secrets.token_hex(6)}@test.local'
+    client.post('/api/auth/register', json={'email': email, 'full_name': 'test', 'password': PASSWORD})
+    response = client.post('/api/auth/login', json={'email': email, 'password': PASSWORD})
+    headers = {'Authorization': f'Bearer {response.get_json()["data"]["access_token"]}'}
+    store.save(session_key_from_token(headers['Authorization']), serialized_context, 'v1')
+    return headers
+
+@pytest.fixture
+def jpeg():
+    """Factory of (filename, bytes) JPEG uploads with noisy, non-blank content."""
+    import cv2
+    import numpy as np
+
+    def make(name: str = 'face.jpg', seed: int = 0, size: int = 200) -> tuple:
+        img = np.random.default_rng(seed).integers(0, 256, (size, size, 3), dtype=np.uint8)
+        return name, cv2.imencode('.jpg', img)[1].tobytes()
+    return make
+
+@pytest.fixture
+def embedding():
+    """Deterministic face embedding per seed, float32 like ArcFace."""
+    import numpy as np
+    from utils import EMBEDDING_SIZE
+
+    return lambda seed: np.random.default_rng(seed).standard_normal(EMBEDDING_SIZE).astype(np.float32)
+
+@pytest.fixture
+def fake_face():
+    """Face as returned by SCRFD: float32 bbox and det_score."""
+    import numpy as np
+    from insightface.app.common import Face
+
+    def make(bbox=(40, 40, 160, 170), det_score: float = 0.9, embedding=None) -> Face:
+        face = Face(bbox=np.array(bbox, dtype=np.float32), kps=None, det_score=np.float32(det_score))
+        if embedding is not None:
+            face.embedding = embedding
+        return face
+    return make
+
+@pytest.fixture(scope='session')
+def context(serialized_context):
+    import tenseal as ts
+    return ts.context_from(serialized_context)
@@ -0,0 +1,24 @@
+import tenseal as ts
+
+from conftest import controller_module
+from utils import EMBEDDING_SIZE, packed_capacity
+
+def test_pack_faces_pads_every_vector_and_records_the_slot_layout(context, embedding):
+    poly_modulus_degree = context.seal_context().data.key_context_data().parms().poly_modulus_degree()
+    capacity = packed_capacity(poly_modulus_degree)
+    embeddings = [embedding(seed).tolist() for seed in range(capacity + 1)]
+    faces = [{'filename': f'face{index}.jpg'} for index in range(capacity + 1)]
+
+    payload = controller_module('face_registration_controller').pack_faces(context, faces, embeddings, poly_modulus_degree)
+
+    assert payload['packing'] == 'ckks-slots'
+    assert [packed['slots'] for packed in payload['packed_embeddings']] == [capacity * EMBEDDING_SIZE] * 2
+    assert payload['packed_embeddings'][1]['slot_layout'] == [{'filename': f'face{capacity}.jpg', 'offset': 0}]
+    assert [face['packed_embedding'] for face in payload['faces']] == \
+        [{'index': 0, 'offset': index * EMBEDDING_SIZE} for index in range(capacity)] + [{'index': 1, 'offset': 0}]
+
+    # Vektor kedua hanya berisi satu wajah, sisanya padding 0
+    values = ts.ckks_vector_from(context, payload['packed_embeddings'][1]['encrypted_embedding']).decrypt()
+    assert len(values) == capacity * EMBEDDING_SIZE
+    assert max(abs(value - expected) for (value, expected) in zip(values, embeddings[-1])) < 1e-3
+    assert max(abs(value) for value in values[EMBEDDING_SIZE:]) < 1e-3
@@ -0,0 +1,117 @@
+import pytest
+
+from conftest import controller_module, upload
+
+def register_face(client, user, jpeg, monkeypatch, face, form=None):
+    monkeypatch.setattr(controller_module('face_registration_controller'), 'get_main_face',
+                        lambda img, *args, **kwargs: face)
+    response = client.post('/api/face-registration/register-faces', headers=user,
+                           data={'images': upload([jpeg('registered.jpg')]), **(form or {})})
+    assert response.status_code == 200, response.get_json()
+
+def test_burst_returns_the_best_frame(client, user, jpeg, embedding, fake_face, monkeypatch):
+    register_face(client, user, jpeg, monkeypatch, fake_face(embedding=embedding(1)))
+
+    controller = controller_module('face_verification_controller')
+    monkeypatch.setattr(controller, 'VERIFICATION_PREPROCESS_PROFILE', 'none')
+    monkeypatch.setattr(controller, 'FACE_SELECTION', 'primary')
+    # Frame dibedakan dari ukurannya; frame 1: wajah paling besar & di tengah
+    bboxes = {200: (10, 10, 60, 60), 210: (30, 30, 180, 180), 220: (150, 150, 200, 200)}
+    monkeypatch.setattr(controller, 'detect_primary_face',
+                        lambda img, timer=None: fake_face(bboxes[img.shape[0]]))
+    monkeypatch.setattr(controller, 'embed_face',
+                        lambda img, face, timer=None: fake_face(face.bbox, embedding=embedding(1)))
+
+    frames = [jpeg(f'frame{index}.jpg', seed=index, size=200 + index * 10) for index in range(3)]
+    response = client.post('/api/face-verification/burst', headers=user,
+                           data={'captured_images': upload(frames)})
+
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert body['frame']['index'] == 1
+    assert body['frames'] == 3
+    assert body['data'][0] > 0.99
+
+def b64_vector(context, values: list) -> str:
+    import base64
+    import tenseal as ts
+    return base64.b64encode(ts.ckks_vector(context, values).serialize()).decode()
+
+def test_decrypt_results_single_scores(context):
+    from metrics import StageTimer
+
+    data = [b64_vector(context, [0.25]), b64_vector(context, [0.75])]
+    results = controller_module('face_verification_controller').decrypt_results(context, data, StageTimer('test'))
+    assert results == pytest.approx([0.25, 0.75], abs=1e-4)
+
+def test_decrypt_results_packed_result(context):
+    from metrics import StageTimer
+
+    data = {'packed': b64_vector(context, [0.1, 0.2, 0.3, 0.0]), 'count': 3}
+    results = controller_module('face_verification_controller').decrypt_results(context, data, StageTimer('test'))
+    assert results == pytest.approx([0.1, 0.2, 0.3], abs=1e-4)
+
+def test_decrypt_results_sums_each_packed_offset(context):
+    from metrics import StageTimer
+
+    # Produk slot-wise dua wajah packed (embedding_size 4) + satu wajah biasa
+    product = [0.1, 0.1, 0.1, 0.1, 0.2, 0.2, 0.2, 0.2, 0.0, 0.0, 0.0, 0.0]
+    data = [
+        {'product': b64_vector(context, product), 'offsets': [0, 4], 'embedding_size': 4},
+        b64_vector(context, [0.9]),
+    ]
+    results = controller_module('face_verification_controller').decrypt_results(context, data, StageTimer('test'))
+    assert results == pytest.approx([0.4, 0.8, 0.9], abs=1e-4)
+
+@pytest.mark.parametrize('status, body, expected', [
+    (409, b'{"error": true, "data": {"reason": "context_missing"}}', True),
+    (409, b'{"error": true, "data": {"reason": "packed_query_missing"}}', False),
+    (400, b'{"error": true, "data": {"reason": "context_missing"}}', False),
+    (409, b'<html>Conflict</html>', False),
+    (409, b'[]', False),
+    (409, b'{"error": true, "data": null}', False),
+])
+def test_context_missing(status, body, expected):
+    import requests
+
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    assert controller_module('face_verification_controller').context_missing(response) is expected
+
+def test_register_and_verify_through_the_stub_backend(client, user, jpeg, embedding, fake_face, monkeypatch, stub_backend):
+    register_face(client, user, jpeg, monkeypatch, fake_face(embedding=embedding(1)))
+    register_face(client, user, jpeg, monkeypatch, fake_face(embedding=embedding(2)))
+    controller = controller_module('face_verification_controller')
+    monkeypatch.setattr(controller, 'get_main_face', lambda img, *args, **kwargs: fake_face(embedding=embedding(2)))
+    monkeypatch.setattr(controller, 'PUBLIC_CONTEXT_REUSE', True)
+    uploads_before = stub_backend.stats['context_uploads']
+
+    for _ in range(2):
+        response = client.post('/api/face-verification', headers=user,
+                               data={'captured_image': upload([jpeg('captured.jpg')])})
+        assert response.status_code == 200, response.get_json()
+        scores = response.get_json()['data']
+        assert len(scores) == 2
+        assert scores[1] == pytest.approx(1.0, abs=1e-3)
+        assert abs(scores[0]) < 0.5
+
+    # Public context hanya diunggah sekali per session
+    assert stub_backend.stats['context_uploads'] == uploads_before + 1
+
+def test_burst_without_a_face_in_any_frame(client, user, jpeg, monkeypatch):
+    monkeypatch.setattr(controller_module('face_verification_controller'), 'detect_primary_face',
+                        lambda img, timer=None: None)
+    frames = [jpeg(f'frame{index}.jpg', seed=index) for index in range(2)]
+    response = client.post('/api/face-verification/burst', headers=user,
+                           data={'captured_images': upload(frames)})
+    assert response.status_code == 400
+    assert response.get_json()['data'] == {'frames': 2}
+
+def test_burst_rejects_too_many_frames(client, user, jpeg):
+    from utils import BURST_MAX_FRAMES
+
+    frames = [jpeg(f'frame{index}.jpg', seed=index) for index in range(BURST_MAX_FRAMES + 1)]
+    response = client.post('/api/face-verification/burst', headers=user,
+                           data={'captured_images': upload(frames)})
+    assert response.status_code == 400
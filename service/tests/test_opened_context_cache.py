@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import pytest
+
+import opened_context_cache
+from opened_context_cache import OpenedContextCache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    # Hanya modul cache yang memakai jam palsu
+    monkeypatch.setattr(opened_context_cache, 'time', SimpleNamespace(time=clock.time))
+    return clock
+
+def put(cache: OpenedContextCache, name: str, size: int, session: str | None = None) -> tuple:
+    entry_key = cache.entry_key(name.encode(), 'phrase')
+    cache.put(session, entry_key, b'k' * 32, name.encode()[:1] * size, 'v1')
+    return entry_key
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = OpenedContextCache(max_bytes=1000, max_entries=10, ttl=60)
+    entry_key = put(cache, 'a', 10, session='s1')
+    buffers = cache._entries[entry_key]
+
+    clock.now += 59
+    assert cache.session_context('s1', 'phrase') == (b'a' * 10, 'v1')
+
+    # TTL dihitung dari akses terakhir
+    clock.now += 59
+    assert cache.derived_key(entry_key) == b'k' * 32
+
+    clock.now += 61
+    assert cache.derived_key(entry_key) is None
+    assert cache.session_context('s1', 'phrase') is None
+    assert cache.stats()['entries'] == 0
+    assert buffers.decrypted_context is None
+    assert bytes(buffers.derived_key) == b'\x00' * 32
+
+def test_session_context_needs_the_same_phrase(clock):
+    cache = OpenedContextCache(max_bytes=1000, max_entries=10, ttl=60)
+    put(cache, 'a', 10, session='s1')
+    assert cache.session_context('s1', 'other phrase') is None
+    assert cache.session_context('s2', 'phrase') is None
+
+def test_over_the_byte_budget_the_least_recently_used_contexts_are_dropped(clock):
+    cache = OpenedContextCache(max_bytes=25, max_entries=10, ttl=60)
+    first = put(cache, 'a', 10)
+    decrypted_first = cache._entries[first].decrypted_context
+    second = put(cache, 'b', 10)
+    decrypted_second = cache._entries[second].decrypted_context
+    clock.now += 1
+    # Akses terakhir: a menjadi yang paling baru dipakai
+    assert cache.context(None, first) == b'a' * 10
+    put(cache, 'c', 10)
+
+    assert cache.context(None, second) is None
+    assert cache.derived_key(second) == b'k' * 32
+    assert cache.context(None, first) == b'a' * 10
+    assert cache.stats()['bytes'] == 20
+    assert bytes(decrypted_first) == b'a' * 10
+    assert bytes(decrypted_second) == b'\x00' * 10
+
+def test_max_entries_removes_the_oldest_entry(clock):
+    cache = OpenedContextCache(max_bytes=1000, max_entries=2, ttl=60)
+    first = put(cache, 'a', 10, session='s1')
+    put(cache, 'b', 10)
+    put(cache, 'c', 10)
+
+    assert cache.derived_key(first) is None
+    assert cache.session_context('s1', 'phrase') is None
+    assert cache.stats()['entries'] == 2
+
+def test_a_context_larger_than_the_budget_keeps_only_its_key(clock):
+    cache = OpenedContextCache(max_bytes=5, max_entries=10, ttl=60)
+    entry_key = put(cache, 'a', 10)
+    assert cache.context(None, entry_key) is None
+    assert cache.derived_key(entry_key) == b'k' * 32
+    assert cache.stats()['bytes'] == 0
+
+def test_disabled_cache_stores_nothing(clock):
+    cache = OpenedContextCache(max_bytes=1000, max_entries=0, ttl=60)
+    entry_key = put(cache, 'a', 10, session='s1')
+    assert cache.derived_key(entry_key) is None
+    assert cache.session_context('s1', 'phrase') is None
@@ -0,0 +1,29 @@
+from conftest import controller_module, upload
+
+def test_packed_faces_are_verified_without_a_client_flag(client, user, store, jpeg, embedding, fake_face, monkeypatch):
+    from context_store import session_key_from_token
+
+    faces = iter([fake_face(embedding=embedding(seed)) for seed in range(3)])
+    monkeypatch.setattr(controller_module('face_registration_controller'), 'get_main_face',
+                        lambda img, *args, **kwargs: next(faces))
+    response = client.post('/api/face-registration/register-faces', headers=user, data={
+        'images': upload([jpeg(f'face{index}.jpg', seed=index) for index in range(3)]),
+        'packed': '1',
+    })
+    assert response.status_code == 200, response.get_json()
+
+    # Session/deployment lain: service belum tahu wajahnya packed
+    key = session_key_from_token(user['Authorization'])
+    store._sessions[key].packed_faces = False
+
+    monkeypatch.setattr(controller_module('face_verification_controller'), 'get_main_face',
+                        lambda img, *args, **kwargs: fake_face(embedding=embedding(1)))
+    response = client.post('/api/face-verification', headers=user,
+                           data={'captured_image': upload([jpeg('captured.jpg')])})
+
+    assert response.status_code == 200, response.get_json()
+    scores = response.get_json()['data']
+    assert len(scores) == 3
+    assert max(range(3), key=lambda index: scores[index]) == 1
+    assert abs(scores[1] - 1.0) < 1e-3
+    assert store.has_packed_faces(key)
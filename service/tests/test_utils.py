@@ -0,0 +1,55 @@
+from io import BytesIO
+
+import pytest
+from werkzeug.datastructures import FileStorage, Headers
+
+from utils import read_jpeg_size, read_upload, InvalidUpload, pack_embeddings
+
+def storage(content: bytes, filename: str = 'face.jpg', content_length: int = 0) -> FileStorage:
+    headers = Headers({'Content-Length': str(content_length)}) if content_length else None
+    return FileStorage(stream=BytesIO(content), filename=filename, headers=headers)
+
+def test_read_jpeg_size(jpeg):
+    (_, content) = jpeg(size=120)
+    assert read_jpeg_size(content) == (120, 120)
+
+@pytest.mark.parametrize('content', [
+    b'',
+    b'\x89PNG\r\n\x1a\n',
+    # EOI sebelum SOF
+    b'\xff\xd8\xff\xd9',
+    # SOF terpotong
+    b'\xff\xd8\xff\xc0\x00\x11\x08\x00',
+])
+def test_read_jpeg_size_rejects_invalid_headers(content):
+    assert read_jpeg_size(content) is None
+
+def test_read_upload_returns_the_content(jpeg):
+    (_, content) = jpeg()
+    assert read_upload(storage(content), max_size=len(content)) == content
+
+@pytest.mark.parametrize('make_upload, message, status', [
+    (lambda content: storage(content, filename='face.png'), 'Invalid file format', 400),
+    (lambda content: storage(b'GIF89a' + content), 'Invalid file format', 400),
+    (lambda content: storage(content[:20]), 'Invalid file format', 400),
+    (lambda content: storage(content, content_length=10 ** 9), 'File too large', 413),
+    (lambda content: storage(content + b'\x00' * 10 ** 6), 'File too large', 413),
+])
+def test_read_upload_rejections(jpeg, make_upload, message, status):
+    (_, content) = jpeg()
+    with pytest.raises(InvalidUpload) as e:
+        read_upload(make_upload(content), max_size=len(content) + 1000)
+    assert (e.value.message, e.value.status) == (message, status)
+
+def test_read_upload_rejects_small_images(jpeg):
+    (_, content) = jpeg(size=32)
+    with pytest.raises(InvalidUpload, match='Image too small'):
+        read_upload(storage(content), max_size=len(content))
+
+def test_pack_embeddings_groups_by_capacity():
+    embeddings = [[float(index)] * 4 for index in range(5)]
+    packed = pack_embeddings(embeddings, capacity=2, embedding_size=4)
+    assert [offsets for (_, offsets) in packed] == [[0, 4], [0, 4], [0]]
+    assert packed[1][0] == [2.0] * 4 + [3.0] * 4
+    with pytest.raises(ValueError):
+        pack_embeddings([[1.0] * 3], capacity=2, embedding_size=4)
@@ -0,0 +1,56 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from worker_pool import ordered_map
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+@pytest.mark.parametrize('max_workers', [1, 3])
+def test_ordered_map_keeps_item_order(executor, max_workers):
+    # Item awal paling lambat selesai
+    def slow_square(value):
+        time.sleep((5 - value) * 0.01)
+        return value * value
+
+    assert list(ordered_map(slow_square, range(5), max_workers, executor)) == [0, 1, 4, 9, 16]
+
+def test_ordered_map_limits_concurrency(executor):
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def track(value):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return value
+
+    assert list(ordered_map(track, range(8), 2, executor)) == list(range(8))
+    assert peak[0] <= 2
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_ordered_map_raises_the_first_exception_in_item_order(executor, max_workers):
+    started = []
+
+    def fail_on_odd(value):
+        started.append(value)
+        if value % 2:
+            raise ValueError(f'item {value}')
+        return value
+
+    results = ordered_map(fail_on_odd, range(10), max_workers, executor)
+    assert next(results) == 0
+    with pytest.raises(ValueError, match='item 1'):
+        next(results)
+    # Item yang belum dimulai dibatalkan
+    time.sleep(0.05)
+    assert max(started) < 9
@@ -0,0 +1,195 @@
+import json
+import time
+import uuid
+import base64
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import request, Response, stream_with_context
+
+from metrics import observe_upstream
+from utils import (
+    BASE_API_URL,
+    UPSTREAM_POOL_SIZE,
+    UPSTREAM_CONNECT_TIMEOUT,
+    UPSTREAM_READ_TIMEOUT,
+    UPSTREAM_RETRIES,
+    WIRE_FORMAT,
+)
+
+# Header hop-by-hop yang tidak boleh diteruskan
+HOP_BY_HOP_HEADERS = {
+    'connection',
+    'keep-alive',
+    'proxy-authenticate',
+    'proxy-authorization',
+    'te',
+    'trailer',
+    'transfer-encoding',
+    'upgrade',
+}
+EXCLUDED_REQUEST_HEADERS = HOP_BY_HOP_HEADERS | {'host', 'content-length'}
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=UPSTREAM_POOL_SIZE,
+        max_retries=Retry(
+            total=UPSTREAM_RETRIES,
+            # Hanya method idempotent tanpa body yang aman diulang
+            allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+            status_forcelist=[502, 503, 504],
+            backoff_factor=0.1,
+            raise_on_status=False,
+        ),
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+session = _create_session()
+
+def forward_headers(headers) -> dict:
+    return {name: value for (name, value) in headers.items()
+            if name.lower() not in EXCLUDED_REQUEST_HEADERS}
+
+def request_upstream(method: str, path: str, **kwargs) -> requests.Response:
+    """Call BASE_API_URL + path through the pooled session."""
+    kwargs.setdefault('timeout', (UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT))
+    started = time.perf_counter()
+    try:
+        response = session.request(method, f'{BASE_API_URL}{path}', **kwargs)
+    except Exception:
+        observe_upstream(method, path, 'error', time.perf_counter() - started)
+        raise
+    observe_upstream(method, path, response.status_code, time.perf_counter() - started)
+    return response
+
+class _RequestBody:
+    """Incoming request body, streamed to the backend with a known length."""
+
+    def __init__(self, stream, length: int):
+        self.stream = stream
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size: int = -1) -> bytes:
+        return self.stream.read(size)
+
+    def __iter__(self):
+        while chunk := self.stream.read(STREAM_CHUNK_SIZE):
+            yield chunk
+
+def encode_binary(value):
+    """Replace every bytes value of a payload with its base64 string."""
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode()
+    if isinstance(value, dict):
+        return {key: encode_binary(item) for (key, item) in value.items()}
+    if isinstance(value, list):
+        return [encode_binary(item) for item in value]
+    return value
+
+def _split_binary(value, path: str, parts: list):
+    if isinstance(value, (bytes, bytearray)):
+        parts.append((path, value))
+        return None
+    if isinstance(value, dict):
+        return {key: _split_binary(item, f'{path}.{key}' if path else str(key), parts)
+                for (key, item) in value.items()}
+    if isinstance(value, list):
+        return [_split_binary(item, f'{path}.{index}' if path else str(index), parts)
+                for (index, item) in enumerate(value)]
+    return value
+
+class MultipartBody:
+    """multipart/form-data body for a payload holding raw bytes.
+
+    Every bytes value becomes its own part, named after its path in the
+    payload (e.g. `faces.0.real_img`), and is replaced by null in the JSON
+    `metadata` part. The parts are streamed as they are, without copying
+    them into one buffer.
+    """
+
+    def __init__(self, payload):
+        boundary = uuid.uuid4().hex
+        parts = []
+        metadata = json.dumps(_split_binary(payload, '', parts)).encode()
+
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        self.chunks = [
+            f'--{boundary}\r\n'
+            'Content-Disposition: form-data; name="metadata"\r\n'
+            'Content-Type: application/json\r\n\r\n'.encode(),
+            metadata,
+            b'\r\n',
+        ]
+        for (name, content) in parts:
+            self.chunks += [
+                f'--{boundary}\r\n'
+                f'Content-Disposition: form-data; name="{name}"; filename="{name}"\r\n'
+                'Content-Type: application/octet-stream\r\n\r\n'.encode(),
+                content,
+                b'\r\n',
+            ]
+        self.chunks.append(f'--{boundary}--\r\n'.encode())
+        self.length = sum(len(chunk) for chunk in self.chunks)
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+def post_payload(path: str, payload, headers: dict, wire_format: str = WIRE_FORMAT) -> requests.Response:
+    """POST a payload whose binary fields are bytes, in the configured wire format."""
+    headers = dict(headers)
+    if wire_format == 'multipart':
+        body = MultipartBody(payload)
+        headers['Content-Type'] = body.content_type
+        return request_upstream('POST', path, headers=headers, data=body)
+
+    headers['Content-Type'] = 'application/json'
+    return request_upstream('POST', path, headers=headers, json=encode_binary(payload))
+
+def _stream_body(response: requests.Response):
+    try:
+        # Body diteruskan apa adanya (tanpa decode gzip/deflate)
+        yield from response.raw.stream(STREAM_CHUNK_SIZE, decode_content=False)
+    finally:
+        response.close()
+
+def proxy(path: str, method: str | None = None, json=None) -> Response:
+    """Forward the current request to the backend and stream the answer back.
+
+    The request body is streamed unless `json` is given, in which case that
+    object is sent instead.
+    """
+    headers = forward_headers(request.headers)
+    kwargs = {}
+    if json is not None:
+        kwargs['json'] = json
+    elif request.content_length:
+        kwargs['data'] = _RequestBody(request.stream, request.content_length)
+
+    response = request_upstream(
+        method or request.method,
+        path,
+        headers=headers,
+        stream=True,
+        **kwargs,
+    )
+
+    headers_to_send = [(name, value) for (name, value) in response.raw.headers.items()
+                    if name.lower() not in HOP_BY_HOP_HEADERS]
+    return Response(
+        stream_with_context(_stream_body(response)),
+        response.status_code,
+        headers_to_send,
+        direct_passthrough=True,
+    )
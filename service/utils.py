@@ -4,12 +4,41 @@ import tenseal as ts
 import cv2
 import numpy as np
 
+from metrics import stage
+
 UPLOAD_FOLDER = 'images'
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg'}
 MAX_CONTENT_LENGTH = 1 * 1024 * 1024  # 1MB
 TEMP_FILE_PATH = os.path.join(os.path.dirname(__file__), 'temp')
-BASE_API_URL = 'http://localhost:5000/api/v1'
+BASE_API_URL = os.environ.get('BASE_API_URL', 'http://localhost:5000/api/v1')
+CORS_ORIGINS = [
+    'http://localhost:5001',
+    'http://localhost:5173'
+]
 CONTEXT_KEY_FILE_NAME = 'context_key.bin'
+CONTEXT_PROFILE_FILE_NAME = 'context_profile'
+
+# HTTP client ke BASE_API_URL
+UPSTREAM_POOL_SIZE = int(os.environ.get('UPSTREAM_POOL_SIZE', 32))
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 3.05))
+UPSTREAM_READ_TIMEOUT = float(os.environ.get('UPSTREAM_READ_TIMEOUT', 60))
+UPSTREAM_RETRIES = int(os.environ.get('UPSTREAM_RETRIES', 2))
+# Format body register-faces & verify ke backend: json (base64) atau multipart (bytes mentah)
+WIRE_FORMAT = os.environ.get('WIRE_FORMAT', 'json').lower()
+# Kirim public context sekali per session, selanjutnya hanya fingerprint-nya
+PUBLIC_CONTEXT_REUSE = os.environ.get('PUBLIC_CONTEXT_REUSE', '0').lower() in ('1', 'true', 'yes', 'on')
+
+# Mode ASGI (asgi_server.py)
+ASGI_UPSTREAM_MAX_CONNECTIONS = int(os.environ.get('ASGI_UPSTREAM_MAX_CONNECTIONS', 1000))
+ASGI_WORKER_THREADS = int(os.environ.get('ASGI_WORKER_THREADS', os.cpu_count() or 4))
+
+CONTEXT_CACHE_MAX_BYTES = int(os.environ.get('CONTEXT_CACHE_MAX_BYTES', 1024 * 1024 * 1024))  # 1GB
+CONTEXT_CACHE_TTL = int(os.environ.get('CONTEXT_CACHE_TTL', 30 * 60))  # 30 menit
+
+# Key Argon2id & context terdekripsi dari open-saved-context-key (MAX_ENTRIES=0 menonaktifkan)
+OPENED_CONTEXT_CACHE_MAX_BYTES = int(os.environ.get('OPENED_CONTEXT_CACHE_MAX_BYTES', 256 * 1024 * 1024))  # 256MB
+OPENED_CONTEXT_CACHE_MAX_ENTRIES = int(os.environ.get('OPENED_CONTEXT_CACHE_MAX_ENTRIES', 256))
+OPENED_CONTEXT_CACHE_TTL = int(os.environ.get('OPENED_CONTEXT_CACHE_TTL', 10 * 60))  # 10 menit
 
 ARGON2ID_KWARGS = {
     'length': 32,
@@ -30,6 +59,97 @@ TENSEAL_KWARGS = {
 
 TENSEAL_GLOBAL_SCALE = 2**40
 
+# Profil parameter CKKS, namanya disimpan bersama context terenkripsi.
+# Profil yang sudah dirilis tidak boleh diubah, tambahkan versi baru.
+CKKS_PROFILES = {
+    # Profil awal, context lama tanpa context_profile memakai ini
+    'v1': {
+        'poly_modulus_degree': TENSEAL_KWARGS['poly_modulus_degree'],
+        'coeff_mod_bit_sizes': TENSEAL_KWARGS['coeff_mod_bit_sizes'],
+        'global_scale': TENSEAL_GLOBAL_SCALE,
+    },
+    # Satu level perkalian, cukup untuk satu dot product
+    'v2': {
+        'poly_modulus_degree': 8192,
+        'coeff_mod_bit_sizes': [60, 40, 60],
+        'global_scale': 2**40,
+    },
+    # Ring 4096 (2048 slot), error dot product ~1e-4
+    'v3': {
+        'poly_modulus_degree': 4096,
+        'coeff_mod_bit_sizes': [38, 32, 38],
+        'global_scale': 2**32,
+    },
+}
+LEGACY_CKKS_PROFILE = 'v1'
+# Profil untuk context key baru
+CKKS_PROFILE = os.environ.get('CKKS_PROFILE', LEGACY_CKKS_PROFILE)
+
+EMBEDDING_SIZE = 512  # ArcFace (buffalo_l)
+
+# Packed mode: beberapa embedding dalam satu CKKS vector
+PACKED_EMBEDDINGS = os.environ.get('PACKED_EMBEDDINGS', '0').lower() in ('1', 'true', 'yes', 'on')
+PACKED_EMBEDDINGS_MAX = 8
+
+# Pipeline register-faces paralel per gambar
+REGISTER_PARALLEL = os.environ.get('REGISTER_PARALLEL', '0').lower() in ('1', 'true', 'yes', 'on')
+REGISTER_MAX_WORKERS_PER_REQUEST = int(os.environ.get('REGISTER_MAX_WORKERS_PER_REQUEST', 2))
+IMAGE_POOL_SIZE = int(os.environ.get('IMAGE_POOL_SIZE', os.cpu_count() or 4))
+
+# Model buffalo_l yang dimuat (landmark & genderage tidak dipakai)
+FACE_MODULES = [name.strip() for name in os.environ.get('FACE_MODULES', 'detection,recognition').split(',') if name.strip()]
+# lazy: muat saat request pertama, background: muat + warmup saat startup,
+# manual: entry point yang memanggil face_analysis.warmup() (prefork_server.py)
+FACE_MODEL_LOADING = os.environ.get('FACE_MODEL_LOADING', 'background')
+ORT_INTRA_OP_THREADS = int(os.environ.get('ORT_INTRA_OP_THREADS', 0))
+
+# prefork_server.py
+PREFORK_WORKERS = int(os.environ.get('PREFORK_WORKERS', os.cpu_count() or 1))
+PREFORK_GRACEFUL_TIMEOUT = float(os.environ.get('PREFORK_GRACEFUL_TIMEOUT', 30))
+
+# primary: hanya wajah terbaik yang di-embed, all: semua wajah (pakai faces[0])
+FACE_SELECTION = os.environ.get('FACE_SELECTION', 'primary')
+MIN_DETECTION_SCORE = 0.3
+
+# Verifikasi burst: beberapa frame per request, hanya frame terbaik yang di-embed
+BURST_MAX_FRAMES = int(os.environ.get('BURST_MAX_FRAMES', 8))
+BURST_MAX_WORKERS_PER_REQUEST = int(os.environ.get('BURST_MAX_WORKERS_PER_REQUEST', 2))
+# Variance of Laplacian wajah yang dianggap cukup tajam (bobot 0.5)
+BURST_SHARPNESS_REFERENCE = float(os.environ.get('BURST_SHARPNESS_REFERENCE', 100))
+
+# Header Server-Timing berisi durasi tiap tahap pipeline (register & verify)
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '0').lower() in ('1', 'true', 'yes', 'on')
+
+# Micro-batching recognition antar request
+BATCH_INFERENCE = os.environ.get('BATCH_INFERENCE', '0').lower() in ('1', 'true', 'yes', 'on')
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 5))
+
+# Profil preprocessing: quality | fast | none
+PREPROCESS_PROFILES = ('quality', 'fast', 'none')
+PREPROCESS_PROFILE = os.environ.get('PREPROCESS_PROFILE', 'quality')
+REGISTRATION_PREPROCESS_PROFILE = os.environ.get('REGISTRATION_PREPROCESS_PROFILE', PREPROCESS_PROFILE)
+VERIFICATION_PREPROCESS_PROFILE = os.environ.get('VERIFICATION_PREPROCESS_PROFILE', PREPROCESS_PROFILE)
+PREPROCESS_MAX_SIZE = 640
+# Decode JPEG langsung di skala 1/2, 1/4 atau 1/8 bila masih >= PREPROCESS_MAX_SIZE
+REDUCED_DECODE = os.environ.get('REDUCED_DECODE', '1').lower() in ('1', 'true', 'yes', 'on')
+
+# Validasi upload sebelum decode
+UPLOAD_CHUNK_SIZE = 64 * 1024
+UPLOAD_MIN_DIMENSION = int(os.environ.get('UPLOAD_MIN_DIMENSION', 64))
+UPLOAD_MAX_PIXELS = int(os.environ.get('UPLOAD_MAX_PIXELS', 40_000_000))
+
+# rgb_img yang dikirim ke backend saat registrasi (real_img = file asli)
+# full: gambar hasil preprocessing, thumbnail: crop wajah kecil
+RGB_IMG_MODE = os.environ.get('RGB_IMG_MODE', 'full')
+# Kosong = format file upload
+RGB_IMG_FORMAT = os.environ.get('RGB_IMG_FORMAT', '').lower()
+RGB_IMG_QUALITY = int(os.environ.get('RGB_IMG_QUALITY', 95))
+RGB_IMG_THUMBNAIL_SIZE = int(os.environ.get('RGB_IMG_THUMBNAIL_SIZE', 160))
+
+# SOF0..SOF15 kecuali DHT (C4), JPG (C8) dan DAC (CC)
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
 def allowed_file(filename: str) -> bool:
     return '.' in filename and \
         filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -49,27 +169,173 @@ def delete_file():
     if os.path.exists(TEMP_FILE_PATH):
         os.remove(TEMP_FILE_PATH)
 
-def preprocess_image(file_bytes, filename, extension):
+SHARPEN_KERNEL = np.array([[0, -1, 0],
+                        [-1, 5,-1],
+                        [0, -1, 0]])
+
+def resize_max(img, max_size: int = PREPROCESS_MAX_SIZE, interpolation=cv2.INTER_LINEAR):
+    h, w = img.shape[:2]
+    scale = max_size / max(h, w)
+    if scale < 1.0:
+        img = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=interpolation)
+    return img
+
+def read_jpeg_size(data) -> tuple[int, int] | None:
+    """Read (width, height) from a JPEG header without decoding it."""
+    data = memoryview(data).cast('B')
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # Padding byte
+            offset += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            # Marker tanpa panjang segmen
+            offset += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            # EOI / SOS sebelum SOF, header tidak valid
+            return None
+
+        segment_length = (data[offset + 2] << 8) | data[offset + 3]
+        if marker in JPEG_SOF_MARKERS:
+            if offset + 9 > len(data):
+                return None
+            height = (data[offset + 5] << 8) | data[offset + 6]
+            width = (data[offset + 7] << 8) | data[offset + 8]
+            return (width, height)
+        offset += 2 + segment_length
+
+    return None
+
+class InvalidUpload(ValueError):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def read_upload(file, max_size: int) -> bytes:
+    """Read an uploaded JPEG in chunks and validate it without decoding.
+
+    Stops reading as soon as `max_size` is exceeded, checks the JPEG magic
+    bytes on the first chunk and the dimensions from the header. Raises
+    InvalidUpload.
+    """
+    if not allowed_file(file.filename):
+        raise InvalidUpload('Invalid file format')
+    if file.content_length and file.content_length > max_size:
+        raise InvalidUpload('File too large', 413)
+
+    chunks = []
+    total = 0
+    while chunk := file.stream.read(UPLOAD_CHUNK_SIZE):
+        if not chunks and chunk[:3] != b'\xff\xd8\xff':
+            raise InvalidUpload('Invalid file format')
+        total += len(chunk)
+        if total > max_size:
+            raise InvalidUpload('File too large', 413)
+        chunks.append(chunk)
+    content = b''.join(chunks)
+
+    size = read_jpeg_size(content)
+    if size is None:
+        raise InvalidUpload('Invalid file format')
+    (width, height) = size
+    if min(width, height) < UPLOAD_MIN_DIMENSION:
+        raise InvalidUpload('Image too small')
+    if width * height > UPLOAD_MAX_PIXELS:
+        raise InvalidUpload('Image too large')
+    return content
+
+def encode_image(img, extension: str, quality: int = RGB_IMG_QUALITY) -> bytes:
+    extension = extension.lower()
+    if not extension.startswith('.'):
+        extension = '.' + extension
+    if extension in ('.jpg', '.jpeg'):
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    elif extension == '.webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    else:
+        params = []
+    success, encoded = cv2.imencode(extension, img, params)
+    if not success:
+        raise ValueError(f'Unable to encode image as {extension}')
+    return encoded.tobytes()
+
+def crop_thumbnail(img, bbox, size: int = RGB_IMG_THUMBNAIL_SIZE, margin: float = 0.2):
+    """Square crop around a face bbox (with margin), resized to at most `size` px."""
+    x1, y1, x2, y2 = bbox
+    half = max(x2 - x1, y2 - y1) * (0.5 + margin)
+    cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+    height, width = img.shape[:2]
+    left, top = max(0, int(cx - half)), max(0, int(cy - half))
+    right, bottom = min(width, int(cx + half)), min(height, int(cy + half))
+    return resize_max(img[top:bottom, left:right], size, interpolation=cv2.INTER_AREA)
+
+def decode_image(file_bytes, max_size: int = PREPROCESS_MAX_SIZE):
+    """Decode a JPEG at the smallest 1/2, 1/4 or 1/8 scale whose longest side
+    is still >= max_size, falling back to a full decode."""
+    if REDUCED_DECODE:
+        size = read_jpeg_size(file_bytes)
+        if size is not None:
+            longest_side = max(size)
+            for factor, flag in (
+                (8, cv2.IMREAD_REDUCED_COLOR_8),
+                (4, cv2.IMREAD_REDUCED_COLOR_4),
+                (2, cv2.IMREAD_REDUCED_COLOR_2),
+            ):
+                if longest_side // factor >= max_size:
+                    return cv2.imdecode(file_bytes, flag)
+
+    return cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+
+def preprocess_image(file_bytes, filename, extension, profile: str = 'quality', timer=None):
+    """Decode an uploaded image and prepare it for face analysis.
+
+    Profiles:
+    - quality: denoise + sharpen at full resolution, then resize
+    - fast: resize first, then a lighter denoise + sharpen
+    - none: resize only
+    """
+    if profile not in PREPROCESS_PROFILES:
+        raise ValueError(f'Unknown preprocess profile: {profile}')
+
     # Baca gambar
-    real_img = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+    with stage(timer, 'decode'):
+        real_img = decode_image(file_bytes)
+        if real_img is None:
+            raise ValueError(f'Unable to decode image: {filename}{extension}')
     
-    # Convert ke RGB
-    rgb_img = cv2.cvtColor(real_img, cv2.COLOR_BGR2RGB)
+        # Convert ke RGB
+        rgb_img = cv2.cvtColor(real_img, cv2.COLOR_BGR2RGB)
 
-    # Denoise
-    rgb_img = cv2.fastNlMeansDenoisingColored(rgb_img, None, 10, 10, 7, 21)
+    if profile == 'quality':
+        with stage(timer, 'denoise'):
+            # Denoise
+            rgb_img = cv2.fastNlMeansDenoisingColored(rgb_img, None, 10, 10, 7, 21)
 
-    # Sharpen
-    kernel = np.array([[0, -1, 0],
-                    [-1, 5,-1],
-                    [0, -1, 0]])
-    rgb_img = cv2.filter2D(rgb_img, -1, kernel)
+            # Sharpen
+            rgb_img = cv2.filter2D(rgb_img, -1, SHARPEN_KERNEL)
 
-    # Resize (maksimal sisi 640px)
-    h, w = rgb_img.shape[:2]
-    scale = 640 / max(h, w)
-    if scale < 1.0:
-        rgb_img = cv2.resize(rgb_img, (int(w * scale), int(h * scale)))
+        # Resize (maksimal sisi 640px)
+        with stage(timer, 'resize'):
+            rgb_img = resize_max(rgb_img)
+    elif profile == 'fast':
+        # Resize dulu, denoise dengan window lebih kecil
+        with stage(timer, 'resize'):
+            rgb_img = resize_max(rgb_img, interpolation=cv2.INTER_AREA)
+        with stage(timer, 'denoise'):
+            rgb_img = cv2.fastNlMeansDenoisingColored(rgb_img, None, 6, 6, 5, 11)
+            rgb_img = cv2.filter2D(rgb_img, -1, SHARPEN_KERNEL)
+    else:
+        with stage(timer, 'resize'):
+            rgb_img = resize_max(rgb_img, interpolation=cv2.INTER_AREA)
 
     # # save real image to images folder
     # cv2.imwrite(os.path.join(app.config['UPLOAD_FOLDER'], f"{filename}_real{extension}"), real_img)
@@ -82,6 +348,68 @@ def preprocess_image(file_bytes, filename, extension):
         'real_img': real_img,
     }
 
+def create_ckks_context(profile: str = CKKS_PROFILE) -> ts.Context:
+    """New CKKS context for a profile, with the Galois and relin keys a dot product needs."""
+    if profile not in CKKS_PROFILES:
+        raise ValueError(f'Unknown CKKS profile: {profile}')
+    params = CKKS_PROFILES[profile]
+    context = ts.context(
+        ts.SCHEME_TYPE.CKKS,
+        poly_modulus_degree=params['poly_modulus_degree'],
+        coeff_mod_bit_sizes=params['coeff_mod_bit_sizes'],
+    )
+    context.global_scale = params['global_scale']
+    context.generate_galois_keys()
+    context.generate_relin_keys()
+    return context
+
+def detect_ckks_profile(context: ts.Context) -> str | None:
+    """Profile whose parameters match a (deserialized) context, None if unknown.
+
+    The parameters are read from the context itself, so the profile does
+    not depend on a label stored next to the encrypted context.
+    """
+    key_context_data = context.seal_context().data.key_context_data()
+    poly_modulus_degree = key_context_data.parms().poly_modulus_degree()
+    coeff_modulus_bits = key_context_data.total_coeff_modulus_bit_count()
+    for name, params in CKKS_PROFILES.items():
+        if params['poly_modulus_degree'] == poly_modulus_degree and \
+                sum(params['coeff_mod_bit_sizes']) == coeff_modulus_bits and \
+                params['global_scale'] == context.global_scale:
+            return name
+    return None
+
+def multiplicative_depth(profile: str) -> int:
+    # Modulus pertama & terakhir bukan level perkalian
+    return len(CKKS_PROFILES[profile]['coeff_mod_bit_sizes']) - 2
+
+def is_truthy(value) -> bool:
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+def packed_capacity(poly_modulus_degree: int, embedding_size: int = EMBEDDING_SIZE) -> int:
+    # CKKS punya poly_modulus_degree / 2 slot
+    slots = poly_modulus_degree // 2
+    return max(1, min(PACKED_EMBEDDINGS_MAX, slots // embedding_size))
+
+def pack_embeddings(embeddings: list, capacity: int, embedding_size: int = EMBEDDING_SIZE):
+    """Group embeddings into flat vectors of at most `capacity` embeddings.
+
+    Returns a list of (flat_vector, offsets) where offsets are the slot
+    offsets of each embedding inside its vector.
+    """
+    packed = []
+    for start in range(0, len(embeddings), capacity):
+        group = embeddings[start:start + capacity]
+        flat_vector = []
+        offsets = []
+        for embedding in group:
+            if len(embedding) != embedding_size:
+                raise ValueError(f'Embedding size must be {embedding_size}, got {len(embedding)}')
+            offsets.append(len(flat_vector))
+            flat_vector.extend(embedding)
+        packed.append((flat_vector, offsets))
+    return packed
+
 def normalize_vector(vector: list):
     vector_norm = np.linalg.norm(vector)
     if vector_norm == 0:
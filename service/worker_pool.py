@@ -0,0 +1,35 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import IMAGE_POOL_SIZE
+
+# Pool bersama untuk pipeline gambar (OpenCV & onnxruntime melepas GIL)
+image_pool = ThreadPoolExecutor(
+    max_workers=IMAGE_POOL_SIZE,
+    thread_name_prefix='image-worker',
+)
+
+def ordered_map(fn, items, max_workers: int, executor: ThreadPoolExecutor = image_pool):
+    """Yield fn(item) for every item, in order, running at most `max_workers`
+    of them at the same time on `executor`.
+
+    The first exception (in item order) is raised as soon as it is reached
+    and every call that has not started yet is cancelled.
+    """
+    if max_workers <= 1:
+        for item in items:
+            yield fn(item)
+        return
+
+    pending = deque()
+    items = iter(items)
+    try:
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= max_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -1,8 +1,11 @@
-import { join, basename, resolve } from 'path';
+import { join, basename, resolve, extname } from 'path';
+import { gzipSync, brotliCompressSync, constants as zlibConstants } from 'zlib';
 import { existsSync, readdirSync, lstatSync, unlinkSync, rmdirSync, writeFileSync, readFileSync, mkdirSync } from 'fs';
 
 const targetSource = './dist'; // Relative path to copy files from
 const targetDestination = '../service/build'; // Relative path to copy files to
+const compressibleExtensions = ['.html', '.js', '.mjs', '.css', '.json', '.svg', '.txt', '.map', '.xml', '.webmanifest'];
+const minCompressSize = 1024; // Small files are not worth compressing
 
 /**
  * Remove directory recursively
@@ -79,6 +82,38 @@ function copyFolderRecursiveSync(source, target, root = false) {
     }
 }
 
+/**
+ * Write .gz and .br variants next to every compressible file
+ * @param {string} dir_path
+ */
+function precompressRecursiveSync(dir_path) {
+    try {
+        readdirSync(dir_path).forEach(function(entry) {
+            const entry_path = join(dir_path, entry);
+            if (lstatSync(entry_path).isDirectory()) {
+                precompressRecursiveSync(entry_path);
+                return;
+            }
+            if (!compressibleExtensions.includes(extname(entry).toLowerCase())) {
+                return;
+            }
+            const content = readFileSync(entry_path);
+            if (content.length < minCompressSize) {
+                return;
+            }
+            writeFileSync(entry_path + '.gz', gzipSync(content, { level: 9 }));
+            writeFileSync(entry_path + '.br', brotliCompressSync(content, {
+                params: {
+                    [zlibConstants.BROTLI_PARAM_QUALITY]: zlibConstants.BROTLI_MAX_QUALITY,
+                    [zlibConstants.BROTLI_PARAM_SIZE_HINT]: content.length,
+                },
+            }));
+        });
+    } catch (err) {
+        console.log(err);
+    }
+}
+
 // Calculate absolute paths using the relative paths we defined at the top
 const sourceFolder = resolve(targetSource);
 const destinationFolder = resolve(targetDestination);
@@ -90,3 +125,6 @@ if (existsSync(destinationFolder)) {
 
 // Copy the build over
 copyFolderRecursiveSync(sourceFolder, destinationFolder, true)
+
+// Precompressed variants, served by the service without compressing per request
+precompressRecursiveSync(destinationFolder)
@@ -18,21 +18,34 @@ import useSnackbar from '../../hooks/Snackbar';
 import useBoundStore from '../../stores';
 import FaceVerificationService from '../../services/FaceVerificationService';
 
+// Beberapa frame per verifikasi, server memilih frame yang paling tajam
+const BURST_FRAMES = 4;
+const BURST_INTERVAL_MS = 150;
+
 function AbsencePage() {
   const { showSnackbar } = useSnackbar();
   const navigate = useNavigate();
   const contextIsOpened = useBoundStore((state) => state.contextOpened);
   const hasRegisteredFaces = useBoundStore((state) => state.hasRegisteredFaces);
-  const [capturedImage, setCapturedImage] = useState(null);
+  const [capturedImages, setCapturedImages] = useState(null);
   const [loading, setLoading] = useState(false);
 
   const cameraRef = useRef(null);
   const runningVerification = useRef(null);
 
-  const capture = useCallback(() => {
+  const capture = useCallback(async () => {
     if (cameraRef.current) {
-      const imageSrc = cameraRef.current?.getScreenshot();
-      setCapturedImage(imageSrc);
+      const frames = [];
+      for (let i = 0; i < BURST_FRAMES; i += 1) {
+        if (i > 0) {
+          await new Promise((resolve) => setTimeout(resolve, BURST_INTERVAL_MS));
+        }
+        const imageSrc = cameraRef.current?.getScreenshot();
+        if (imageSrc) {
+          frames.push(imageSrc);
+        }
+      }
+      setCapturedImages(frames.length > 0 ? frames : null);
     }
     return;
   }, [cameraRef]);
@@ -45,20 +58,22 @@ function AbsencePage() {
   };
 
   useEffect(() => {
-    if (capturedImage) {
+    if (capturedImages) {
       const verifyFace = async () => {
         try {
           setLoading(true);
-          const capturedImageFile = await fetch(capturedImage);
-          const blobFile = await capturedImageFile.blob();
           const formData = new FormData();
           const filename = dayjs().format('YYYY-MM-DD_HH-mm-ss');
-          formData.append('captured_image', blobFile, `${filename}_face_verify.jpg`);
+          for (const [index, capturedImage] of capturedImages.entries()) {
+            const capturedImageFile = await fetch(capturedImage);
+            const blobFile = await capturedImageFile.blob();
+            formData.append('captured_images', blobFile, `${filename}_face_verify_${index}.jpg`);
+          }
 
           const ctrl = new AbortController();
           runningVerification.current = ctrl;
 
-          const response = await FaceVerificationService.verifyFace(
+          const response = await FaceVerificationService.verifyFaceBurst(
             formData,
             ctrl.signal
           );
@@ -70,7 +85,7 @@ function AbsencePage() {
             severity: 'error',
           });
         } finally {
-          setCapturedImage(null);
+          setCapturedImages(null);
           setLoading(false);
         }
       };
@@ -82,7 +97,7 @@ function AbsencePage() {
       runningVerification.current?.abort();
       runningVerification.current = null;
     };
-  }, [capturedImage]);
+  }, [capturedImages]);
 
   return (
     <Grid container>
@@ -139,14 +154,14 @@ function AbsencePage() {
                       <CircularProgress size="4rem" />
                     </Box>
                   )}
-                  {capturedImage ? (
+                  {capturedImages ? (
                     <Box
                       sx={{
                         position: 'absolute',
                         top: 0,
                         left: 0,
                         zIndex: 1,
-                        backgroundImage: `url(${capturedImage})`,
+                        backgroundImage: `url(${capturedImages[0]})`,
                         backgroundSize: 'contain',
                         backgroundRepeat: 'no-repeat',
                         backgroundPosition: 'center',
@@ -191,8 +206,8 @@ function AbsencePage() {
                 </Button>
               ) : ( */}
               <Button
-                disabled={loading || capturedImage}
-                loading={loading || capturedImage}
+                disabled={loading || !!capturedImages}
+                loading={loading || !!capturedImages}
                 onClick={capture}
                 startIcon={<CenterFocusStrongOutlinedIcon />}
                 variant="contained"
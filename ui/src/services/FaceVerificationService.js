@@ -12,6 +12,14 @@ const endpoints = {
       },
     });
   },
+  verifyFaceBurst: (payload, signal) => {
+    return axios.post(`${url}${module}/burst`, payload, {
+      signal,
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+    });
+  },
 };
 
 export default endpoints;